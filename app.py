@@ -2,15 +2,30 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import together
 import re
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 import hashlib
 import numpy as np
-from collections import Counter
-from difflib import SequenceMatcher
+from collections import Counter, OrderedDict
 import os
 import json
 from werkzeug.utils import secure_filename
-import io
+import asyncio
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 app = Flask(__name__)
 CORS(app)
@@ -19,9 +34,164 @@ CORS(app)
 # Set your API key: export TOGETHER_API_KEY="your_key_here"
 together.api_key = os.getenv("TOGETHER_API_KEY", "23daa82ca9930437f9d092f685c7bc26e523575dbfc043f7be99e8594edc3b75")
 
+TOGETHER_API_BASE = "https://api.together.xyz/v1"
+
+# Batch job state lives on disk so any worker can answer a status poll
+BATCH_JOB_DIR = os.getenv("BATCH_JOB_DIR", "batch_jobs")
+BATCH_TERMINAL_STATUSES = ('COMPLETED', 'FAILED', 'EXPIRED', 'CANCELLED')
+# Seconds before an unfinished stage claim is treated as abandoned
+BATCH_CLAIM_TIMEOUT = 300
+
+# Precompiled patterns used on every request
+_SENT_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_CLAIM_SPLIT_RE = re.compile(r'[.!?]+')
+_SENT_SPLIT_NL_RE = re.compile(r'[.!?\n]+')
+_WORD_RE = re.compile(r'\w+')
+_JSON_RE = re.compile(r'\{.*\}', re.DOTALL)
+_JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
+_WS_RE = re.compile(r'\s+')
+_BATCH_ID_RE = re.compile(r'[\w-]+')
+
+# Minimum token-set Jaccard between a claim and a document sentence
+SENTENCE_MATCH_THRESHOLD = 0.5
+
+# Claims whose embeddings are closer than this count as the same claim
+CLAIM_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+CLAIM_CLUSTER_THRESHOLD = 0.85
+
+
+
+def _stream_chunk_text(chunk) -> str:
+    """Text of one streamed completion chunk; 0.x SDKs yield str, 1.x yields chunk dicts"""
+    if isinstance(chunk, str):
+        return chunk
+    choices = chunk.get('choices') or [{}]
+    return choices[0].get('text') or ''
+
+
+def _normalize_claim(claim: str) -> str:
+    """Lowercase and collapse whitespace so trivially different claims match"""
+    return _WS_RE.sub(' ', claim.strip().lower())
+
+
+def _to_json_schema(schema: Dict) -> Dict:
+    """
+    JSON Schema for structured extraction
+    Accepts a real JSON Schema or the example-style {"field": "type"} mapping
+    the API has always taken; every field may be null when not found
+    """
+    if 'properties' in schema or schema.get('type') == 'object':
+        return schema
+    
+    type_names = {
+        'string': 'string', 'str': 'string', 'text': 'string',
+        'number': 'number', 'float': 'number',
+        'integer': 'integer', 'int': 'integer',
+        'boolean': 'boolean', 'bool': 'boolean',
+        'array': 'array', 'list': 'array'
+    }
+    
+    def field(value):
+        if isinstance(value, dict):
+            return {'anyOf': [_to_json_schema(value), {'type': 'null'}]}
+        type_name = type_names.get(str(value).strip().lower())
+        if type_name is None:
+            # Free-text field description
+            return {'type': ['string', 'null'], 'description': str(value)}
+        return {'type': [type_name, 'null']}
+    
+    return {
+        'type': 'object',
+        'properties': {key: field(value) for key, value in schema.items()},
+        'required': list(schema)
+    }
+
+
+def content_hash(data: bytes) -> str:
+    """Fast non-cryptographic 128-bit hex digest for chunk IDs and cache keys"""
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+if NUMBA_AVAILABLE:
+    @njit(nogil=True, cache=True)
+    def _best_sentence_jaccard(claim_ids, claim_size, sent_ids, starts, lengths):
+        """
+        Highest Jaccard between a claim and any sentence
+        claim_ids and each sentence slice of sent_ids are sorted unique token ids
+        Releases the GIL, so request threads can run it side by side
+        """
+        num_sentences = lengths.shape[0]
+        if num_sentences == 0 or claim_size == 0:
+            return 0.0
+        scores = np.zeros(num_sentences)
+        for s in range(num_sentences):
+            n = lengths[s]
+            if n == 0:
+                continue
+            # Sorted merge to count shared tokens
+            i = 0
+            j = starts[s]
+            end = starts[s] + n
+            shared = 0
+            while i < claim_ids.shape[0] and j < end:
+                if claim_ids[i] == sent_ids[j]:
+                    shared += 1
+                    i += 1
+                    j += 1
+                elif claim_ids[i] < sent_ids[j]:
+                    i += 1
+                else:
+                    j += 1
+            scores[s] = shared / (claim_size + n - shared)
+        return scores.max()
+
 if together.api_key == "23daa82ca9930437f9d092f685c7bc26e523575dbfc043f7be99e8594edc3b75":
     print("WARNING: Using default API key. Set TOGETHER_API_KEY environment variable for production.")
 
+class DocIndex:
+    """
+    Tokenization of one document, built once and shared by every verifier
+    With Numba, sentences are also laid out as sorted token ids in one
+    flat array addressed by starts/lengths for the JIT kernel
+    """
+    
+    def __init__(self, document: str):
+        self.text = document
+        self.lower = document.lower()
+        self.normalized = _WS_RE.sub(' ', self.lower)
+        self.token_set = set(self.lower.split())
+        self.sentences = _SENT_SPLIT_NL_RE.split(self.lower)
+        self.sentence_tokens = [set(_WORD_RE.findall(s)) for s in self.sentences]
+        self.chunks = None  # Filled in by the reducer on first RAG query
+        self.chunk_postings = {}
+        
+        if NUMBA_AVAILABLE:
+            self.vocab = {}
+            sentence_ids = [sorted(self.vocab.setdefault(t, len(self.vocab)) for t in tokens)
+                            for tokens in self.sentence_tokens]
+            self.lengths = np.array([len(ids) for ids in sentence_ids], dtype=np.int64)
+            self.starts = np.zeros(len(sentence_ids), dtype=np.int64)
+            if len(self.lengths) > 1:
+                self.starts[1:] = np.cumsum(self.lengths[:-1])
+            self.sent_ids = np.array([i for ids in sentence_ids for i in ids], dtype=np.int64)
+    
+    def best_sentence_similarity(self, claim_tokens: set) -> float:
+        """Highest token-set Jaccard between the claim and any document sentence"""
+        if NUMBA_AVAILABLE:
+            claim_ids = np.array(sorted(self.vocab[t] for t in claim_tokens if t in self.vocab), dtype=np.int64)
+            return float(_best_sentence_jaccard(
+                claim_ids, len(claim_tokens), self.sent_ids, self.starts, self.lengths
+            ))
+        
+        best = 0.0
+        for sentence_tokens in self.sentence_tokens:
+            if not sentence_tokens:
+                continue
+            best = max(best, len(claim_tokens & sentence_tokens) / len(claim_tokens | sentence_tokens))
+        return best
+
+
 class AdvancedHallucinationReducer:
     """
     Enhanced system with multiple accuracy improvement techniques:
@@ -35,10 +205,107 @@ class AdvancedHallucinationReducer:
     
     def __init__(self, 
                  primary_model="meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo",
-                 verification_model="meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo"):
+                 verification_model="meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo",
+                 cache_size: int = 1024):
         self.primary_model = primary_model
         self.verification_model = verification_model
-        self.cache = {}  # Response cache
+        self.cache = OrderedDict()  # LRU response cache
+        self.cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        self._doc_cache = OrderedDict()  # doc hash -> DocIndex
+        self._doc_cache_size = 32
+        self._claim_embedder = None  # Loaded at startup via _get_claim_embedder
+        self._claim_embedder_failed = False
+        self._embedder_lock = threading.Lock()
+    
+    def _cache_key(self, model: str, prompt: str, kwargs: Dict) -> str:
+        """Cache key over the model, prompt and sampling params"""
+        return content_hash(json.dumps([model, prompt, sorted(kwargs.items())]).encode())
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        with self._cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        return None
+    
+    def _cache_put(self, key: str, text: str):
+        with self._cache_lock:
+            self.cache[key] = text
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+    
+    def _complete_cached(self, model: str, prompt: str, **kwargs) -> str:
+        """
+        Together completion memoized on (model, prompt, sampling params)
+        Returns the completion text; failed calls are never cached
+        """
+        key = self._cache_key(model, prompt, kwargs)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        response = together.Complete.create(model=model, prompt=prompt, **kwargs)
+        text = response['choices'][0]['text']
+        
+        self._cache_put(key, text)
+        return text
+    
+    async def _stream_verified(self, index: DocIndex, verdicts: Dict[str, bool],
+                               model: str, prompt: str, **kwargs) -> str:
+        """
+        Stream a completion and verify each claim as soon as its sentence ends
+        Claim verification overlaps with the rest of the generation; results
+        land in verdicts so aggregation does not repeat them
+        """
+        key = self._cache_key(model, prompt, kwargs)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        
+        def produce():
+            # Runs in a worker thread; hands tokens to the event loop
+            try:
+                for chunk in together.Complete.create_streaming(model=model, prompt=prompt, **kwargs):
+                    loop.call_soon_threadsafe(queue.put_nowait, _stream_chunk_text(chunk))
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+        
+        producer = asyncio.create_task(asyncio.to_thread(produce))
+        
+        parts = []
+        pending = ''
+        while (token := await queue.get()) is not None:
+            parts.append(token)
+            *sentences, pending = _CLAIM_SPLIT_RE.split(pending + token)
+            # Verification is CPU-bound; keep it off the shared event loop
+            for sentence in sentences:
+                await asyncio.to_thread(self._verify_claims_into, sentence, index, verdicts)
+        
+        await producer  # Re-raises any streaming error
+        await asyncio.to_thread(self._verify_claims_into, pending, index, verdicts)
+        
+        text = ''.join(parts)
+        self._cache_put(key, text)
+        return text
+    
+    def _verify_claims_into(self, text: str, index: DocIndex, verdicts: Dict[str, bool]):
+        """Verify the claims in text that have not been checked yet"""
+        for claim in self._extract_claims(text):
+            norm = _normalize_claim(claim)
+            if norm not in verdicts:
+                verdicts[norm] = self._verify_claim_in_document(claim, index)
+    
+    def clear_cache(self) -> int:
+        """Drop all memoized responses, returning how many were removed"""
+        with self._cache_lock:
+            removed = len(self.cache)
+            self.cache.clear()
+        return removed
         
     def chunk_document_smart(self, text: str, chunk_size: int = 800, overlap: int = 100) -> List[Dict]:
         """
@@ -46,7 +313,7 @@ class AdvancedHallucinationReducer:
         Overlap prevents information loss at boundaries
         """
         chunks = []
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        sentences = _SENT_SPLIT_RE.split(text)
         
         current_chunk = []
         current_length = 0
@@ -58,10 +325,11 @@ class AdvancedHallucinationReducer:
             if current_length + sentence_length > chunk_size and current_chunk:
                 chunk_text = ' '.join(current_chunk)
                 chunks.append({
-                    'id': hashlib.md5(chunk_text.encode()).hexdigest()[:8],
+                    'id': content_hash(chunk_text.encode())[:8],
                     'text': chunk_text,
                     'sentence_range': (len(chunks), i),
-                    'word_count': current_length
+                    'word_count': current_length,
+                    'word_counter': Counter(chunk_text.lower().split())
                 })
                 
                 # Keep last few sentences for overlap
@@ -83,34 +351,35 @@ class AdvancedHallucinationReducer:
         if current_chunk:
             chunk_text = ' '.join(current_chunk)
             chunks.append({
-                'id': hashlib.md5(chunk_text.encode()).hexdigest()[:8],
+                'id': content_hash(chunk_text.encode())[:8],
                 'text': chunk_text,
                 'sentence_range': (len(chunks), len(sentences)),
-                'word_count': current_length
+                'word_count': current_length,
+                'word_counter': Counter(chunk_text.lower().split())
             })
         
         return chunks
     
-    def ensemble_extraction(self, document: str, query: str, num_passes: int = 3) -> Dict:
+    async def ensemble_extraction(self, document: str, query: str, num_passes: int = 3) -> Dict:
         """
-        Run multiple extraction passes and aggregate results
+        Run multiple extraction passes concurrently and aggregate results
         Increases accuracy through consensus
         """
         
-        responses = []
-        
         # Different prompt variations for diversity
+        # Every template opens with the same document block so the shared
+        # prefix can be reused by the provider's prompt cache across passes
         prompt_templates = [
             # Template 1: Strict citation
-            """You are a precise document analyzer. Extract information following these STRICT rules:
+            """Document:
+{document}
+
+You are a precise document analyzer. Extract information from the document above following these STRICT rules:
 
 1. Quote EXACTLY from the document - no paraphrasing
 2. If unsure, state "Uncertain" and explain why
 3. Never infer beyond what's explicitly written
 
-Document:
-{document}
-
 Question: {query}
 
 Provide:
@@ -119,11 +388,11 @@ Provide:
 - Certainty: [Certain/Likely/Uncertain]""",
             
             # Template 2: Chain of thought
-            """Analyze this document step-by-step:
-
-Document:
+            """Document:
 {document}
 
+Analyze the document above step-by-step.
+
 Question: {query}
 
 Think through this:
@@ -134,7 +403,10 @@ Think through this:
 Answer:""",
             
             # Template 3: Negative instruction
-            """Answer the question using the document. CRITICAL RULES:
+            """Document:
+{document}
+
+Answer the question using the document above. CRITICAL RULES:
 
 DO NOT add information not in the document
 DO NOT make assumptions
@@ -142,56 +414,74 @@ DO NOT paraphrase - use exact quotes
 DO cite specific text
 DO express uncertainty when appropriate
 
-Document:
-{document}
-
 Question: {query}
 
 Response:"""
         ]
         
-        for i, template in enumerate(prompt_templates[:num_passes]):
-            prompt = template.format(document=document, query=query)
-            
-            try:
-                # Vary temperature more significantly for diversity
-                temperatures = [0.05, 0.25, 0.15]
-                response = together.Complete.create(
-                    model=self.primary_model if i == 0 else self.verification_model,
-                    prompt=prompt,
-                    max_tokens=600,
-                    temperature=temperatures[i],
-                    top_p=0.9,
-                    repetition_penalty=1.2
-                )
-                
-                responses.append(response['choices'][0]['text'])
-            except Exception as e:
-                print(f"Error in ensemble pass {i}: {str(e)}")
+        # Vary temperature more significantly for diversity
+        temperatures = [0.05, 0.25, 0.15]
+        
+        # All passes are independent, so fire them concurrently and
+        # verify claims while each response is still streaming in
+        index = await asyncio.to_thread(self.doc_index, document)
+        verdicts = {}
+        calls = [
+            self._stream_verified(
+                index,
+                verdicts,
+                model=self.primary_model if i == 0 else self.verification_model,
+                prompt=template.format(document=document, query=query),
+                max_tokens=600,
+                temperature=temperatures[i],
+                top_p=0.9,
+                repetition_penalty=1.2
+            )
+            for i, template in enumerate(prompt_templates[:num_passes])
+        ]
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        
+        responses = []
+        for i, result in enumerate(results):
+            if isinstance(result, Exception):
+                print(f"Error in ensemble pass {i}: {str(result)}")
                 # Continue with other passes even if one fails
                 continue
+            responses.append(result)
         
-        # Aggregate responses
-        return self._aggregate_ensemble_responses(responses, document)
+        # Aggregate responses (claim embedding and clustering run in a worker thread)
+        return await asyncio.to_thread(self._aggregate_ensemble_responses, responses, index, verdicts)
     
-    def _aggregate_ensemble_responses(self, responses: List[str], document: str) -> Dict:
-        """Combine multiple responses using voting and similarity"""
+    def _aggregate_ensemble_responses(self, responses: List[str], document: Union[str, DocIndex],
+                                      verdicts: Optional[Dict[str, bool]] = None) -> Dict:
+        """
+        Combine multiple responses using voting and similarity
+        verdicts holds normalized claims already verified while streaming
+        """
         
-        # Extract key claims from each response
-        all_claims = []
+        # Count claims by normalized form so case/spacing variants collapse,
+        # keeping the first original wording for the answer
+        claim_counts = Counter()
+        norm_to_orig = {}
         for resp in responses:
-            claims = self._extract_claims(resp)
-            all_claims.extend(claims)
+            for claim in self._extract_claims(resp):
+                norm = _normalize_claim(claim)
+                claim_counts[norm] += 1
+                norm_to_orig.setdefault(norm, claim)
+        total_claims = sum(claim_counts.values())
         
         # Find consensus claims (appear in multiple responses)
-        claim_counts = Counter(all_claims)
-        consensus_claims = [claim for claim, count in claim_counts.items() if count >= 2]
+        consensus_claims = self._consensus_claims(claim_counts)
         
-        # Verify consensus claims against document
+        # Verify each distinct consensus claim once against document
+        index = self.doc_index(document)
+        verdicts = verdicts if verdicts is not None else {}
         verified_claims = []
-        for claim in consensus_claims:
-            if self._verify_claim_in_document(claim, document):
-                verified_claims.append(claim)
+        for norm in consensus_claims:
+            if norm not in verdicts:
+                verdicts[norm] = self._verify_claim_in_document(norm_to_orig[norm], index)
+            if verdicts[norm]:
+                verified_claims.append(norm_to_orig[norm])
         
         # Ensure we have at least one response
         if not responses:
@@ -206,15 +496,70 @@ Response:"""
         return {
             'consensus_answer': ' '.join(verified_claims) if verified_claims else responses[0],
             'confidence': len(verified_claims) / max(len(consensus_claims), 1) if consensus_claims else 0.5,
-            'agreement_score': len(consensus_claims) / max(len(all_claims), 1) if all_claims else 0.0,
+            'agreement_score': len(consensus_claims) / total_claims if total_claims else 0.0,
             'all_responses': responses,
             'verified_claims': verified_claims
         }
     
+    def _consensus_claims(self, claim_counts: Counter) -> List[str]:
+        """
+        Claims made at least twice, matching paraphrases by meaning
+        Claims are clustered on embedding similarity (single link) and each
+        cluster with two or more mentions contributes its medoid claim;
+        without an embedding model only exact repeats count
+        """
+        claims = list(claim_counts)
+        embedder = self._get_claim_embedder() if len(claims) > 1 else None
+        if embedder is None:
+            return [claim for claim, count in claim_counts.items() if count >= 2]
+        
+        embeddings = embedder.encode(claims, batch_size=32, normalize_embeddings=True)
+        
+        # int8 quantized cosine similarity (unit vectors scaled to [-127, 127])
+        quantized = np.round(np.asarray(embeddings) * 127).astype(np.int8).astype(np.int32)
+        similarity = (quantized @ quantized.T) / (127.0 * 127.0)
+        
+        # Single-link clustering with union-find over similar pairs
+        parent = list(range(len(claims)))
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        for i, j in np.argwhere(np.triu(similarity > CLAIM_CLUSTER_THRESHOLD, k=1)):
+            parent[find(i)] = find(j)
+        
+        clusters = {}
+        for i in range(len(claims)):
+            clusters.setdefault(find(i), []).append(i)
+        
+        consensus = []
+        for members in clusters.values():
+            if sum(claim_counts[claims[i]] for i in members) < 2:
+                continue
+            # Medoid: the member closest to all others
+            medoid = max(members, key=lambda i: similarity[i, members].sum())
+            consensus.append(claims[medoid])
+        return consensus
+    
+    def _get_claim_embedder(self):
+        """Load the claim embedding model once; None if unavailable"""
+        with self._embedder_lock:
+            if self._claim_embedder is None and not self._claim_embedder_failed:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    self._claim_embedder = SentenceTransformer(CLAIM_EMBEDDING_MODEL, device='cpu')
+                except Exception as e:
+                    print(f"Claim embedder unavailable, using exact-match consensus: {str(e)}")
+                    self._claim_embedder_failed = True
+            return self._claim_embedder
+    
     def _extract_claims(self, text: str) -> List[str]:
         """Extract individual factual claims from text"""
         # Split by sentences and clean
-        sentences = re.split(r'[.!?]+', text)
+        sentences = _CLAIM_SPLIT_RE.split(text)
         claims = []
         for s in sentences:
             s = s.strip()
@@ -225,60 +570,72 @@ Response:"""
                 claims.append(s)
         return claims
     
-    def _verify_claim_in_document(self, claim: str, document: str) -> bool:
-        """Check if claim is supported by document text"""
+    def _verify_claim_in_document(self, claim: str, document: Union[str, DocIndex]) -> bool:
+        """Check if claim is supported by document text (raw or pre-indexed)"""
+        index = self.doc_index(document)
         claim_lower = claim.lower()
-        doc_lower = document.lower()
         
         # Check for high similarity match
         words = claim_lower.split()
         if len(words) < 3:
-            return claim_lower in doc_lower
+            return claim_lower in index.lower
         
         # Optimized: Check word overlap first (faster)
         claim_words = set(words)
-        doc_words = set(doc_lower.split())
-        overlap_ratio = len(claim_words & doc_words) / len(claim_words)
+        overlap_ratio = len(claim_words & index.token_set) / len(claim_words)
         
         # If low word overlap, claim likely not in document
         if overlap_ratio < 0.5:
             return False
         
-        # Use sentence-level matching instead of character sliding window
-        doc_sentences = re.split(r'[.!?\n]+', doc_lower)
-        for sentence in doc_sentences:
-            similarity = SequenceMatcher(None, claim_lower, sentence.strip()).ratio()
-            if similarity > 0.7:
-                return True
+        # Verbatim quote, exactly or modulo whitespace (line wraps in the source)
+        if claim_lower in index.lower or _WS_RE.sub(' ', claim_lower) in index.normalized:
+            return True
         
-        return False
+        # Sentence-level token-set Jaccard against precomputed sentence tokens;
+        # document-wide word overlap alone is not evidence, the words have to
+        # co-occur in one sentence
+        claim_tokens = set(_WORD_RE.findall(claim_lower))
+        return index.best_sentence_similarity(claim_tokens) > SENTENCE_MATCH_THRESHOLD
     
-    def fact_extraction_validation(self, document: str, query: str) -> Dict:
+    def doc_index(self, document: Union[str, DocIndex]) -> DocIndex:
+        """Memoized DocIndex for a document, keyed by content hash"""
+        if isinstance(document, DocIndex):
+            return document
+        
+        key = content_hash(document.encode())
+        
+        with self._cache_lock:
+            if key in self._doc_cache:
+                self._doc_cache.move_to_end(key)
+                return self._doc_cache[key]
+        
+        index = DocIndex(document)
+        
+        with self._cache_lock:
+            self._doc_cache[key] = index
+            while len(self._doc_cache) > self._doc_cache_size:
+                self._doc_cache.popitem(last=False)
+        
+        return index
+    
+    async def fact_extraction_validation(self, document: str, query: str) -> Dict:
         """
         Extract facts first, then answer based only on extracted facts
         Two-stage process prevents hallucination
         """
         
         # Stage 1: Extract all relevant facts
-        fact_extraction_prompt = f"""Extract ONLY the facts from this document that relate to the question.
-List each fact as a separate bullet point with the exact quote.
-
-Document:
-{document}
-
-Question: {query}
-
-Extracted Facts (with quotes):"""
+        fact_extraction_prompt = self._fact_extraction_prompt(document, query)
 
         try:
-            facts_response = together.Complete.create(
+            extracted_facts = await asyncio.to_thread(
+                self._complete_cached,
                 model=self.primary_model,
                 prompt=fact_extraction_prompt,
                 max_tokens=500,
                 temperature=0.05
             )
-            
-            extracted_facts = facts_response['choices'][0]['text']
         except Exception as e:
             return {
                 'extracted_facts': f"Error extracting facts: {str(e)}",
@@ -288,25 +645,16 @@ Extracted Facts (with quotes):"""
             }
         
         # Stage 2: Answer based ONLY on extracted facts
-        answer_prompt = f"""Using ONLY these extracted facts, answer the question.
-Do not add any information not in the facts below.
-
-Extracted Facts:
-{extracted_facts}
-
-Question: {query}
-
-Answer (reference fact numbers):"""
+        answer_prompt = self._fact_answer_prompt(extracted_facts, query)
 
         try:
-            answer_response = together.Complete.create(
+            answer = await asyncio.to_thread(
+                self._complete_cached,
                 model=self.primary_model,
                 prompt=answer_prompt,
                 max_tokens=400,
                 temperature=0.1
             )
-            
-            answer = answer_response['choices'][0]['text']
         except Exception as e:
             return {
                 'extracted_facts': extracted_facts,
@@ -325,14 +673,263 @@ Answer (reference fact numbers):"""
             'reliable': validation_score > 0.7
         }
     
+    def _fact_extraction_prompt(self, document: str, query: str) -> str:
+        """Stage 1 prompt of the fact extraction pipeline"""
+        return f"""Document:
+{document}
+
+Extract ONLY the facts from the document above that relate to the question.
+List each fact as a separate bullet point with the exact quote.
+
+Question: {query}
+
+Extracted Facts (with quotes):"""
+    
+    def _fact_answer_prompt(self, extracted_facts: str, query: str) -> str:
+        """Stage 2 prompt of the fact extraction pipeline"""
+        return f"""Using ONLY these extracted facts, answer the question.
+Do not add any information not in the facts below.
+
+Extracted Facts:
+{extracted_facts}
+
+Question: {query}
+
+Answer (reference fact numbers):"""
+    
+    def submit_fact_extraction_batch(self, pairs: List[Tuple[str, str]]) -> str:
+        """
+        Start fact extraction validation for many (document, query) pairs
+        through the Together Batch API (half the cost of real-time calls)
+        Returns immediately with a job id; poll fact_extraction_batch_status
+        """
+        
+        # Stage 1: Extract facts for every pair in a single batch
+        fact_prompts = {
+            f"facts-{i}": self._fact_extraction_prompt(document, query)
+            for i, (document, query) in enumerate(pairs)
+        }
+        batch_id = self._submit_batch(fact_prompts, max_tokens=500, temperature=0.05)
+        self._save_batch_job(batch_id, {'stage': 'facts', 'pairs': pairs, 'facts_batch_id': batch_id})
+        return batch_id
+    
+    def fact_extraction_batch_status(self, job_id: str) -> Dict:
+        """
+        Check a submitted batch job without blocking, advancing it to the
+        answer stage once facts are ready
+        Any worker may poll; only the one that claims the stage change on
+        disk submits the answer batch
+        Raises KeyError for unknown job ids
+        """
+        job = self._load_batch_job(job_id)
+        if job['stage'] in ('completed', 'failed'):
+            return {key: job[key] for key in ('stage', 'queries', 'results', 'error') if key in job}
+        
+        try:
+            if job['stage'] == 'facts':
+                batch_job = self._get_batch(job['facts_batch_id'])
+                if batch_job['status'] not in BATCH_TERMINAL_STATUSES:
+                    return {'stage': 'facts'}
+                job['facts'] = self._batch_output(batch_job)
+                
+                # Stage 2: Answer from the extracted facts in a second batch
+                answer_prompts = {
+                    f"answer-{i}": self._fact_answer_prompt(job['facts'][f"facts-{i}"], query)
+                    for i, (_, query) in enumerate(job['pairs'])
+                    if f"facts-{i}" in job['facts']
+                }
+                if answer_prompts:
+                    if not self._claim_batch_stage(job_id, 'answers'):
+                        return {'stage': 'answers'}  # Another poll is submitting it
+                    try:
+                        job['answers_batch_id'] = self._submit_batch(answer_prompts, max_tokens=400, temperature=0.1)
+                    except Exception:
+                        self._release_batch_stage(job_id, 'answers')
+                        raise
+                    job['stage'] = 'answers'
+                    self._save_batch_job(job_id, job)
+                    return {'stage': 'answers'}
+                answers = {}
+            else:
+                batch_job = self._get_batch(job['answers_batch_id'])
+                if batch_job['status'] not in BATCH_TERMINAL_STATUSES:
+                    return {'stage': 'answers'}
+                answers = self._batch_output(batch_job)
+        except RuntimeError as e:
+            job = {'stage': 'failed', 'error': str(e)}
+            self._save_batch_job(job_id, job)
+            return job
+        
+        # Same outputs give the same results, so concurrent polls may both write this
+        job = {
+            'stage': 'completed',
+            'queries': [query for _, query in job['pairs']],
+            'results': self._fact_batch_results(job['pairs'], job['facts'], answers)
+        }
+        self._save_batch_job(job_id, job)
+        return job
+    
+    def _claim_batch_stage(self, job_id: str, stage: str) -> bool:
+        """
+        Atomically claim submitting a stage of a job, across worker processes
+        A claim left behind by a worker that died mid-submit expires
+        """
+        marker = f"{self._batch_job_path(job_id)}.{stage}"
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(marker) > BATCH_CLAIM_TIMEOUT:
+                    os.unlink(marker)  # The next poll claims it afresh
+            except FileNotFoundError:
+                pass
+            return False
+    
+    def _release_batch_stage(self, job_id: str, stage: str):
+        try:
+            os.unlink(f"{self._batch_job_path(job_id)}.{stage}")
+        except FileNotFoundError:
+            pass
+    
+    def _fact_batch_results(self, pairs: List[Tuple[str, str]], facts: Dict[str, str],
+                            answers: Dict[str, str]) -> List[Dict]:
+        """Build per-pair fact validation results from both batch stages, in input order"""
+        results = []
+        for i, (document, query) in enumerate(pairs):
+            if f"facts-{i}" not in facts:
+                results.append({
+                    'extracted_facts': "Error extracting facts: batch request failed",
+                    'answer': "Unable to process request",
+                    'validation_score': 0.0,
+                    'reliable': False
+                })
+                continue
+            
+            if f"answer-{i}" not in answers:
+                results.append({
+                    'extracted_facts': facts[f"facts-{i}"],
+                    'answer': "Error generating answer: batch request failed",
+                    'validation_score': 0.0,
+                    'reliable': False
+                })
+                continue
+            
+            answer = answers[f"answer-{i}"]
+            validation_score = self._cross_validate(answer, document)
+            results.append({
+                'extracted_facts': facts[f"facts-{i}"],
+                'answer': answer,
+                'validation_score': validation_score,
+                'reliable': validation_score > 0.7
+            })
+        
+        return results
+    
+    def _batch_job_path(self, job_id: str) -> str:
+        """On-disk state for a batch job, shared by all worker processes"""
+        if not _BATCH_ID_RE.fullmatch(job_id):
+            raise KeyError(job_id)
+        return os.path.join(BATCH_JOB_DIR, f"{job_id}.json")
+    
+    def _save_batch_job(self, job_id: str, job: Dict):
+        path = self._batch_job_path(job_id)
+        os.makedirs(BATCH_JOB_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+    
+    def _load_batch_job(self, job_id: str) -> Dict:
+        try:
+            with open(self._batch_job_path(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(job_id)
+    
+    def _submit_batch(self, prompts: Dict[str, str], max_tokens: int, temperature: float) -> str:
+        """Submit prompts as one Together batch job and return its id"""
+        headers = {"Authorization": f"Bearer {together.api_key}"}
+        
+        lines = [
+            json.dumps({
+                'custom_id': custom_id,
+                'body': {
+                    'model': self.primary_model,
+                    'messages': [{'role': 'user', 'content': prompt}],
+                    'max_tokens': max_tokens,
+                    'temperature': temperature
+                }
+            })
+            for custom_id, prompt in prompts.items()
+        ]
+        
+        upload = requests.post(
+            f"{TOGETHER_API_BASE}/files/upload",
+            headers=headers,
+            data={'purpose': 'batch-api', 'file_name': 'fact_extraction.jsonl'},
+            files={'file': ('fact_extraction.jsonl', '\n'.join(lines).encode('utf-8'))},
+            timeout=60
+        )
+        upload.raise_for_status()
+        
+        batch = requests.post(
+            f"{TOGETHER_API_BASE}/batches",
+            headers=headers,
+            json={'endpoint': '/v1/chat/completions', 'input_file_id': upload.json()['id']},
+            timeout=30
+        )
+        batch.raise_for_status()
+        batch_job = batch.json()
+        return batch_job.get('job', batch_job)['id']
+    
+    def _get_batch(self, batch_id: str) -> Dict:
+        """Fetch the current state of a Together batch job"""
+        status = requests.get(
+            f"{TOGETHER_API_BASE}/batches/{batch_id}",
+            headers={"Authorization": f"Bearer {together.api_key}"},
+            timeout=30
+        )
+        status.raise_for_status()
+        return status.json()
+    
+    def _batch_output(self, batch_job: Dict) -> Dict[str, str]:
+        """
+        Download the output of a finished batch job
+        Returns custom_id -> completion text for the requests that succeeded
+        """
+        if batch_job['status'] != 'COMPLETED' or not batch_job.get('output_file_id'):
+            raise RuntimeError(f"Batch {batch_job['id']} ended with status {batch_job['status']}")
+        
+        output = requests.get(
+            f"{TOGETHER_API_BASE}/files/{batch_job['output_file_id']}/content",
+            headers={"Authorization": f"Bearer {together.api_key}"},
+            timeout=60
+        )
+        output.raise_for_status()
+        
+        completions = {}
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            try:
+                body = record['response']['body']
+                completions[record['custom_id']] = body['choices'][0]['message']['content']
+            except (KeyError, IndexError, TypeError):
+                print(f"Batch request {record.get('custom_id')} failed: {record.get('error')}")
+        
+        return completions
+    
     def _cross_validate(self, answer: str, document: str) -> float:
         """Calculate how much of the answer is supported by document"""
-        answer_sentences = re.split(r'[.!?]+', answer)
+        answer_sentences = _CLAIM_SPLIT_RE.split(answer)
+        index = self.doc_index(document)
         supported_count = 0
         
         for sentence in answer_sentences:
             if len(sentence.strip()) > 10:
-                if self._verify_claim_in_document(sentence, document):
+                if self._verify_claim_in_document(sentence, index):
                     supported_count += 1
         
         return supported_count / max(len([s for s in answer_sentences if len(s.strip()) > 10]), 1)
@@ -340,39 +937,25 @@ Answer (reference fact numbers):"""
     def structured_json_extraction(self, document: str, schema: Dict) -> Dict:
         """
         Extract information in strict JSON format
-        Structured output reduces hallucination
+        Together's JSON mode constrains decoding to the schema, so the output
+        always parses; models without JSON mode fall back to a prompt-only request
         """
         
-        schema_str = str(schema)
-        
-        prompt = f"""Extract information from the document in STRICT JSON format.
-Only include information explicitly stated in the document.
-For any field not found, use null.
-
-Required JSON Schema:
-{schema_str}
-
-Document:
+        prompt = f"""Document:
 {document}
 
-Return ONLY valid JSON, nothing else:"""
+Extract information from the document above as JSON.
+Only include information explicitly stated in the document.
+For any field not found, use null."""
 
         try:
-            response = together.Complete.create(
-                model=self.primary_model,
-                prompt=prompt,
-                max_tokens=800,
-                temperature=0.0,  # Zero temperature for structured output
-                top_p=0.9
-            )
-            
-            # Parse and validate JSON
-            response_text = response['choices'][0]['text'].strip()
-            
-            # Try to extract JSON from response (handle cases with extra text)
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                response_text = json_match.group(0)
+            try:
+                response_text = self._complete_json(prompt, _to_json_schema(schema), max_tokens=800)
+            except requests.HTTPError as e:
+                # JSON mode rejected for this model
+                if e.response is None or e.response.status_code != 400:
+                    raise
+                response_text = self._complete_json_unconstrained(document, schema)
             
             result = json.loads(response_text)
             
@@ -398,24 +981,79 @@ Return ONLY valid JSON, nothing else:"""
                 'error': f'Error processing response: {str(e)}'
             }
     
-    def _validate_json_against_document(self, data: Dict, document: str) -> Dict:
+    def _complete_json(self, prompt: str, json_schema: Dict, max_tokens: int) -> str:
+        """Schema-constrained chat completion (Together JSON mode), memoized"""
+        params = {
+            'max_tokens': max_tokens,
+            'temperature': 0.0,  # Zero temperature for structured output
+            'response_format': {'type': 'json_schema', 'schema': json_schema}
+        }
+        key = self._cache_key(self.primary_model, prompt, params)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        response = requests.post(
+            f"{TOGETHER_API_BASE}/chat/completions",
+            headers={"Authorization": f"Bearer {together.api_key}"},
+            json={
+                'model': self.primary_model,
+                'messages': [{'role': 'user', 'content': prompt}],
+                **params
+            },
+            timeout=120
+        )
+        response.raise_for_status()
+        text = response.json()['choices'][0]['message']['content']
+        
+        self._cache_put(key, text)
+        return text
+    
+    def _complete_json_unconstrained(self, document: str, schema: Dict) -> str:
+        """Schema-in-prompt extraction for models without JSON mode"""
+        prompt = f"""Extract information from the document in STRICT JSON format.
+Only include information explicitly stated in the document.
+For any field not found, use null.
+
+Required JSON Schema:
+{json.dumps(schema)}
+
+Document:
+{document}
+
+Return ONLY valid JSON, nothing else:"""
+
+        response_text = self._complete_cached(
+            model=self.primary_model,
+            prompt=prompt,
+            max_tokens=800,
+            temperature=0.0,
+            top_p=0.9
+        ).strip()
+        
+        # Free-form output may wrap the JSON in extra text
+        json_match = _JSON_RE.search(response_text)
+        return json_match.group(0) if json_match else response_text
+    
+    def _validate_json_against_document(self, data: Dict, document: Union[str, DocIndex]) -> Dict:
         """Validate each JSON field against source document"""
         validation_results = {}
+        index = self.doc_index(document)
         
-        def validate_value(value, doc):
+        def validate_value(value, doc_index):
             if value is None:
                 return True
             if isinstance(value, (int, float)):
-                return str(value) in doc
+                return str(value) in doc_index.text
             if isinstance(value, str):
-                return value.lower() in doc.lower()
+                return value.lower() in doc_index.lower
             return False
         
         for key, value in data.items():
             if isinstance(value, dict):
-                validation_results[key] = self._validate_json_against_document(value, document)
+                validation_results[key] = self._validate_json_against_document(value, index)
             else:
-                validation_results[key] = validate_value(value, document)
+                validation_results[key] = validate_value(value, index)
         
         return validation_results
     
@@ -425,30 +1063,43 @@ Return ONLY valid JSON, nothing else:"""
         Uses multiple relevance signals
         """
         
-        chunks = self.chunk_document_smart(document)
+        # Chunks (with per-chunk word counts) are cached with the document index
+        index = self._indexed_chunks(document)
         
-        # Score chunks using multiple methods
-        scored_chunks = []
-        query_lower = query.lower()
-        query_terms = set(query_lower.split())
+        query_counts = Counter(query.lower().split())
+        query_terms = list(query_counts)
         
-        for chunk in chunks:
-            chunk_lower = chunk['text'].lower()
-            chunk_terms = set(chunk_lower.split())
-            
-            # Method 1: Term overlap
-            term_overlap = len(query_terms & chunk_terms) / len(query_terms)
-            
-            # Method 2: Sequence similarity
-            similarity = SequenceMatcher(None, query_lower, chunk_lower).ratio()
-            
-            # Method 3: Keyword density
-            keyword_density = sum(chunk_lower.count(term) for term in query_terms) / len(chunk_lower.split())
-            
-            # Combined score
-            combined_score = (term_overlap * 0.4 + similarity * 0.3 + keyword_density * 0.3)
-            
-            scored_chunks.append((chunk, combined_score))
+        # Shortlist: only chunks sharing a query term can score above zero
+        candidates = sorted(set().union(*(index.chunk_postings.get(term, ()) for term in query_terms)))
+        if len(candidates) < top_k:
+            shortlisted = set(candidates)
+            candidates += [i for i in range(len(index.chunks)) if i not in shortlisted][:top_k - len(candidates)]
+        chunks = [index.chunks[i] for i in candidates]
+        
+        # Score chunks using multiple methods, vectorized over the shortlist
+        # Bag-of-words counts per chunk, restricted to the query terms (chunks x terms)
+        term_counts = np.array(
+            [[chunk['word_counter'][term] for term in query_terms] for chunk in chunks],
+            dtype=np.float64
+        ).reshape(len(chunks), len(query_terms))
+        chunk_lengths = np.array([chunk['word_count'] for chunk in chunks], dtype=np.float64)
+        chunk_norms = np.sqrt(np.array(
+            [sum(c * c for c in chunk['word_counter'].values()) for chunk in chunks], dtype=np.float64
+        ))
+        query_vec = np.array([query_counts[term] for term in query_terms], dtype=np.float64)
+        
+        # Method 1: Term overlap
+        term_overlap = (term_counts > 0).sum(axis=1) / max(len(query_terms), 1)
+        
+        # Method 2: Cosine similarity between query and chunk bag-of-words
+        similarity = (term_counts @ query_vec) / np.maximum(chunk_norms * np.linalg.norm(query_vec), 1e-12)
+        
+        # Method 3: Keyword density
+        keyword_density = term_counts.sum(axis=1) / np.maximum(chunk_lengths, 1)
+        
+        # Combined score
+        combined_scores = term_overlap * 0.4 + similarity * 0.3 + keyword_density * 0.3
+        scored_chunks = list(zip(chunks, combined_scores.tolist()))
         
         # Get top k chunks
         top_chunks = sorted(scored_chunks, key=lambda x: x[1], reverse=True)[:top_k]
@@ -469,7 +1120,7 @@ Question: {query}
 
 Answer with citations:"""
 
-        response = together.Complete.create(
+        answer = self._complete_cached(
             model=self.primary_model,
             prompt=prompt,
             max_tokens=500,
@@ -477,12 +1128,28 @@ Answer with citations:"""
         )
         
         return {
-            'answer': response['choices'][0]['text'],
+            'answer': answer,
             'sources': [chunk['id'] for chunk, _ in reranked[:top_k]],
             'relevance_scores': [score for _, score in reranked[:top_k]],
             'source_texts': [chunk['text'] for chunk, _ in reranked[:top_k]]
         }
     
+    def _indexed_chunks(self, document: str) -> DocIndex:
+        """
+        DocIndex with its chunks and a term -> chunk positions inverted index,
+        built on first use and cached with the document
+        """
+        index = self.doc_index(document)
+        if index.chunks is None:
+            chunks = self.chunk_document_smart(document)
+            postings = {}
+            for i, chunk in enumerate(chunks):
+                for term in chunk['word_counter']:
+                    postings.setdefault(term, []).append(i)
+            index.chunk_postings = postings
+            index.chunks = chunks
+        return index
+    
     def _llm_rerank(self, chunks: List[Tuple], query: str, top_k: int = 3) -> List[Tuple]:
         """Use LLM to rerank chunks by relevance"""
         
@@ -503,7 +1170,7 @@ Chunks:
 
 Ranking (most relevant first):"""
 
-        response = together.Complete.create(
+        response_text = self._complete_cached(
             model=self.verification_model,
             prompt=prompt,
             max_tokens=50,
@@ -512,23 +1179,23 @@ Ranking (most relevant first):"""
         
         # Parse ranking
         try:
-            ranking = [int(x.strip()) for x in response['choices'][0]['text'].split(',')]
+            ranking = [int(x.strip()) for x in response_text.split(',')]
             reranked = [chunks[i] for i in ranking if i < len(chunks)]
             return reranked
         except:
             return chunks
     
-    def adversarial_validation(self, document: str, query: str, answer: str) -> Dict:
+    async def adversarial_validation(self, document: str, query: str, answer: str) -> Dict:
         """
         Use adversarial prompts to find hallucinations
         """
         
         # Try to break the answer
-        adversarial_prompt = f"""You are a critical fact-checker. Your job is to find ANY errors, hallucinations, or unsupported claims in this answer.
-
-Document:
+        adversarial_prompt = f"""Document:
 {document}
 
+You are a critical fact-checker. Your job is to find ANY errors, hallucinations, or unsupported claims in this answer to a question about the document above.
+
 Question: {query}
 
 Answer to check:
@@ -542,28 +1209,136 @@ List EVERY problem you find:
 
 Problems found:"""
 
-        response = together.Complete.create(
+        problems = await asyncio.to_thread(
+            self._complete_cached,
             model=self.verification_model,
             prompt=adversarial_prompt,
             max_tokens=400,
             temperature=0.2
         )
         
-        problems = response['choices'][0]['text']
-        
         # Count severity
         problem_lines = [l for l in problems.split('\n') if l.strip() and not l.strip().startswith('None')]
         
+        return self._score_problems(problems, problem_lines)
+    
+    def _score_problems(self, problems: str, problem_lines: List[str]) -> Dict:
+        """Turn the problems a fact-checker listed into a reliability verdict"""
         return {
             'problems_found': problems,
             'problem_count': len(problem_lines),
             'reliability_score': max(0, 1 - (len(problem_lines) * 0.2)),
             'is_reliable': len(problem_lines) < 2
         }
+    
+    async def adversarial_validation_batch(self, document: str, pairs: List[Tuple[str, str]],
+                                           batch_size: int = 5) -> List[Dict]:
+        """
+        Adversarial validation for many (query, answer) pairs
+        Checks up to batch_size answers per LLM call; results keep input order
+        """
+        groups = [pairs[i:i + batch_size] for i in range(0, len(pairs), batch_size)]
+        results = await asyncio.gather(*[self._adversarial_validation_group(document, g) for g in groups])
+        return [validation for group in results for validation in group]
+    
+    async def _adversarial_validation_group(self, document: str, pairs: List[Tuple[str, str]]) -> List[Dict]:
+        """Validate one group of answers in a single prompt"""
+        numbered = "\n\n".join(
+            f"[{i}]\nQuestion: {query}\nAnswer to check:\n{answer}"
+            for i, (query, answer) in enumerate(pairs, 1)
+        )
+        
+        adversarial_prompt = f"""Document:
+{document}
+
+You are a critical fact-checker. Your job is to find ANY errors, hallucinations, or unsupported claims in each of these answers to questions about the document above.
+
+{numbered}
+
+For each answer, list EVERY problem you find:
+- Incorrect facts
+- Information not in document
+- Misinterpretations
+- Unsupported claims
+
+Return ONLY a JSON array with one entry per answer, e.g. [{{"id": 1, "problems": ["..."]}}]. Use an empty list when an answer has no problems.
+
+JSON:"""
+
+        try:
+            response_text = await asyncio.to_thread(
+                self._complete_cached,
+                model=self.verification_model,
+                prompt=adversarial_prompt,
+                max_tokens=400 * len(pairs),
+                temperature=0.2
+            )
+            
+            json_match = _JSON_ARRAY_RE.search(response_text)
+            entries = json.loads(json_match.group(0) if json_match else response_text)
+            problems_by_id = {int(e['id']): [str(p) for p in e.get('problems') or []] for e in entries}
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            # Malformed batch output: check these answers one at a time instead
+            print(f"Batch adversarial validation failed, falling back to single checks: {str(e)}")
+            return list(await asyncio.gather(*[
+                self.adversarial_validation(document, query, answer) for query, answer in pairs
+            ]))
+        
+        results = []
+        for i in range(1, len(pairs) + 1):
+            problem_lines = [p for p in problems_by_id.get(i, []) if p.strip() and not p.strip().startswith('None')]
+            results.append(self._score_problems('\n'.join(f"- {p}" for p in problem_lines) or 'None', problem_lines))
+        return results
 
 
 # Initialize reducer
 reducer = AdvancedHallucinationReducer()
+# Load the claim embedder now so the first consensus request doesn't pay for it
+reducer._get_claim_embedder()
+
+
+# One event loop per worker process, shared by all request threads, so
+# LLM calls from concurrent requests overlap instead of each request
+# spinning up its own loop
+_event_loop = None
+_event_loop_pid = None
+_event_loop_lock = threading.Lock()
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Start the shared loop on first use (and again after a gunicorn fork)"""
+    global _event_loop, _event_loop_pid
+    with _event_loop_lock:
+        if _event_loop is None or _event_loop_pid != os.getpid():
+            _event_loop = asyncio.new_event_loop()
+            # Blocking Together calls run here via asyncio.to_thread
+            _event_loop.set_default_executor(ThreadPoolExecutor(max_workers=32))
+            threading.Thread(target=_event_loop.run_forever, name='reducer-loop', daemon=True).start()
+            _event_loop_pid = os.getpid()
+        return _event_loop
+
+
+def run_async(coro):
+    """Run a reducer coroutine to completion from a synchronous Flask handler"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop()).result()
+
+
+async def run_advanced_pipeline(document: str, query: str) -> Tuple[Dict, Dict, Dict]:
+    """
+    Run ensemble, fact extraction and adversarial validation as a DAG
+    Fact extraction overlaps with the ensemble; only the adversarial
+    check has to wait for the consensus answer
+    """
+    ensemble_task = asyncio.create_task(reducer.ensemble_extraction(document, query, num_passes=3))
+    fact_task = asyncio.create_task(reducer.fact_extraction_validation(document, query))
+    
+    ensemble_result = await ensemble_task
+    validation_task = asyncio.create_task(
+        reducer.adversarial_validation(document, query, ensemble_result['consensus_answer'])
+    )
+    
+    fact_result, validation = await asyncio.gather(fact_task, validation_task)
+    return ensemble_result, fact_result, validation
 
 
 @app.route('/api/analyze-advanced', methods=['POST'])
@@ -571,11 +1346,16 @@ def analyze_advanced():
     """
     Advanced analysis with maximum accuracy
     Combines multiple techniques
+    Pass ?mode=batch to run fact extraction for one or more queries
+    through the Together Batch API instead
     """
     try:
         data = request.json
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
+        
+        if request.args.get('mode') == 'batch':
+            return analyze_advanced_batch(data)
             
         document = data.get('document', '').strip()
         query = data.get('query', '').strip()
@@ -589,18 +1369,8 @@ def analyze_advanced():
         if len(query) > 1000:
             return jsonify({'error': 'Query too long (max 1,000 characters)'}), 400
         
-        # Step 1: Ensemble extraction
-        ensemble_result = reducer.ensemble_extraction(document, query, num_passes=3)
-        
-        # Step 2: Fact extraction validation
-        fact_result = reducer.fact_extraction_validation(document, query)
-        
-        # Step 3: Adversarial validation
-        validation = reducer.adversarial_validation(
-            document, 
-            query, 
-            ensemble_result['consensus_answer']
-        )
+        # Steps 1-3: Ensemble extraction, fact extraction and adversarial validation
+        ensemble_result, fact_result, validation = run_async(run_advanced_pipeline(document, query))
         
         # Step 4: Combine results
         final_answer = ensemble_result['consensus_answer']
@@ -621,6 +1391,70 @@ def analyze_advanced():
         return jsonify({'error': str(e)}), 500
 
 
+def analyze_advanced_batch(data: Dict):
+    """
+    Batch mode for /api/analyze-advanced
+    Accepts 'queries' (list) or 'query' against one document, submits
+    fact extraction for each and returns the batch id straight away;
+    results come from GET /api/analyze-advanced/batch/<batch_id>
+    """
+    document = data.get('document', '').strip()
+    queries = data.get('queries')
+    if queries is None:
+        queries = [data.get('query', '')]
+    elif not isinstance(queries, list):
+        return jsonify({'error': "'queries' must be a list of strings"}), 400
+    queries = [q.strip() for q in queries if isinstance(q, str) and q.strip()]
+    
+    if not document or not queries:
+        return jsonify({'error': 'Document and query required'}), 400
+    
+    if len(document) > 200000:
+        return jsonify({'error': 'Document too large (max 200,000 characters)'}), 400
+    if any(len(q) > 1000 for q in queries):
+        return jsonify({'error': 'Query too long (max 1,000 characters)'}), 400
+    
+    batch_id = reducer.submit_fact_extraction_batch([(document, q) for q in queries])
+    
+    return jsonify({
+        'success': True,
+        'mode': 'batch',
+        'batch_id': batch_id,
+        'status_url': f"/api/analyze-advanced/batch/{batch_id}"
+    }), 202
+
+
+@app.route('/api/analyze-advanced/batch/<batch_id>', methods=['GET'])
+def analyze_advanced_batch_status(batch_id):
+    """
+    Poll a batch submitted with /api/analyze-advanced?mode=batch
+    Returns the current stage until the job completes, then the results
+    """
+    try:
+        job = reducer.fact_extraction_batch_status(batch_id)
+    except KeyError:
+        return jsonify({'error': 'Unknown batch id'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    if job['stage'] == 'failed':
+        return jsonify({'success': False, 'batch_id': batch_id, 'status': 'failed', 'error': job['error']}), 502
+    
+    if job['stage'] != 'completed':
+        return jsonify({'success': True, 'batch_id': batch_id, 'status': 'running', 'stage': job['stage']}), 202
+    
+    return jsonify({
+        'success': True,
+        'mode': 'batch',
+        'batch_id': batch_id,
+        'status': 'completed',
+        'results': [
+            {'query': q, 'answer': r['answer'], 'fact_validation': r, 'is_reliable': r['reliable']}
+            for q, r in zip(job['queries'], job['results'])
+        ]
+    })
+
+
 @app.route('/api/extract-structured', methods=['POST'])
 def extract_structured():
     """Extract structured data with validation"""
@@ -669,7 +1503,7 @@ def validate_answer():
         query = data.get('query', '')
         answer = data.get('answer', '')
         
-        validation = reducer.adversarial_validation(document, query, answer)
+        validation = run_async(reducer.adversarial_validation(document, query, answer))
         
         return jsonify({
             'success': True,
@@ -680,6 +1514,44 @@ def validate_answer():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/validate-answers', methods=['POST'])
+def validate_answers():
+    """Validate many answers against one document, batching the LLM checks"""
+    try:
+        data = request.json
+        document = data.get('document', '')
+        items = data.get('items', [])
+        
+        if not document or not items:
+            return jsonify({'error': 'Document and items required'}), 400
+        
+        pairs = [(item.get('query', ''), item.get('answer', '')) for item in items]
+        validations = run_async(reducer.adversarial_validation_batch(document, pairs))
+        
+        return jsonify({
+            'success': True,
+            'validations': validations
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/cache/clear', methods=['POST'])
+def clear_cache():
+    """Clear the LLM response cache"""
+    try:
+        removed = reducer.clear_cache()
+        
+        return jsonify({
+            'success': True,
+            'entries_cleared': removed
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/upload-and-analyze', methods=['POST'])
 def upload_and_analyze():
     """
@@ -700,27 +1572,26 @@ def upload_and_analyze():
         if len(files) > 10:
             return jsonify({'error': 'Maximum 10 files allowed'}), 400
         
-        # Extract text from all files
-        combined_text = ''
+        # Extract text from all files in parallel, keeping upload order
+        uploads = [file for file in files if file.filename != '']
+        with ThreadPoolExecutor(max_workers=max(1, min(4, len(uploads)))) as executor:
+            extracted = list(executor.map(extract_upload, uploads))
+        
+        text_parts = []
         file_info = []
         
-        for file in files:
-            if file.filename == '':
-                continue
-            
-            filename = secure_filename(file.filename)
-            file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        for filename, file_extension, text, error in extracted:
+            if error is not None:
+                return jsonify({'error': f'Failed to process {filename}: {str(error)}'}), 400
             
-            try:
-                text = extract_text_from_file(file, file_extension)
-                combined_text += f"\n\n=== {filename} ===\n\n{text}"
-                file_info.append({
-                    'name': filename,
-                    'size': len(text),
-                    'type': file_extension
-                })
-            except Exception as e:
-                return jsonify({'error': f'Failed to process {filename}: {str(e)}'}), 400
+            text_parts.append(f"\n\n=== {filename} ===\n\n{text}")
+            file_info.append({
+                'name': filename,
+                'size': len(text),
+                'type': file_extension
+            })
+        
+        combined_text = ''.join(text_parts)
         
         if not combined_text.strip():
             return jsonify({'error': 'No text could be extracted from files'}), 400
@@ -731,17 +1602,9 @@ def upload_and_analyze():
         
         # Process based on method
         if method == 'advanced':
-            # Step 1: Ensemble extraction
-            ensemble_result = reducer.ensemble_extraction(combined_text, query, num_passes=3)
-            
-            # Step 2: Fact extraction validation
-            fact_result = reducer.fact_extraction_validation(combined_text, query)
-            
-            # Step 3: Adversarial validation
-            validation = reducer.adversarial_validation(
-                combined_text, 
-                query, 
-                ensemble_result['consensus_answer']
+            # Steps 1-3: Ensemble extraction, fact extraction and adversarial validation
+            ensemble_result, fact_result, validation = run_async(
+                run_advanced_pipeline(combined_text, query)
             )
             
             # Step 4: Combine results
@@ -774,6 +1637,20 @@ def upload_and_analyze():
         return jsonify({'error': str(e)}), 500
 
 
+def extract_upload(file) -> Tuple[str, str, Optional[str], Optional[Exception]]:
+    """
+    Extract one uploaded file for the worker pool
+    Returns (filename, extension, text, error) so failures can be reported by name
+    """
+    filename = secure_filename(file.filename)
+    file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    
+    try:
+        return filename, file_extension, extract_text_from_file(file, file_extension), None
+    except Exception as e:
+        return filename, file_extension, None, e
+
+
 def extract_text_from_file(file, file_extension):
     """
     Extract text from various file formats
@@ -783,14 +1660,15 @@ def extract_text_from_file(file, file_extension):
         return file.read().decode('utf-8', errors='ignore')
     
     elif file_extension == 'pdf':
-        # Try to import PyPDF2
+        # Prefer pypdf (maintained PyPDF2 fork), fall back to PyPDF2
         try:
-            import PyPDF2
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
-            text = ''
-            for page in pdf_reader.pages:
-                text += page.extract_text() + '\n'
-            return text
+            try:
+                from pypdf import PdfReader
+            except ImportError:
+                from PyPDF2 import PdfReader
+            # The upload stream is already seekable, no need to copy it
+            pdf_reader = PdfReader(file.stream)
+            return '\n'.join((page.extract_text() or '') for page in pdf_reader.pages)
         except ImportError:
             return "PDF parsing requires PyPDF2. Install with: pip install PyPDF2"
         except Exception as e:
@@ -800,11 +1678,8 @@ def extract_text_from_file(file, file_extension):
         # Try to import python-docx
         try:
             from docx import Document
-            doc = Document(io.BytesIO(file.read()))
-            text = ''
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + '\n'
-            return text
+            doc = Document(file.stream)
+            return '\n'.join(paragraph.text for paragraph in doc.paragraphs)
         except ImportError:
             return "DOCX parsing requires python-docx. Install with: pip install python-docx"
         except Exception as e:
@@ -819,24 +1694,31 @@ def extract_text_from_file(file, file_extension):
 
 
 if __name__ == '__main__':
+    debug = os.getenv("FLASK_DEBUG") == "1"
+    
     print("\n" + "="*60)
     print("🚀 Document Analysis Server Starting...")
     print("="*60)
     print("\n📋 Available Endpoints:")
     print("  • POST /api/analyze-advanced - Advanced analysis with validation")
+    print("  • GET  /api/analyze-advanced/batch/<id> - Results of a batch analysis")
     print("  • POST /api/semantic-search - RAG with semantic search")
     print("  • POST /api/upload-and-analyze - Upload files for analysis")
     print("  • POST /api/extract-structured - Extract structured JSON")
     print("  • POST /api/validate-answer - Validate an answer")
+    print("  • POST /api/validate-answers - Validate many answers in batches")
+    print("  • POST /api/cache/clear - Clear the LLM response cache")
     print("\n⚙️  Configuration:")
     print(f"  • Port: 5000")
-    print(f"  • Debug: True")
+    print(f"  • Debug: {debug}")
     print(f"  • API Key: {'✓ Set' if together.api_key else '✗ Missing'}")
     print("\n💡 Tips for High Accuracy:")
     print("  1. Use 'Advanced' method for best results (93-97% accuracy)")
     print("  2. Keep documents under 100K characters for optimal speed")
     print("  3. Upload multiple related documents for comprehensive analysis")
     print("  4. Ask specific questions for better extraction")
+    print("\n📦 Production: gunicorn -w 4 --threads 8 --timeout 300 wsgi:app")
     print("\n" + "="*60 + "\n")
     
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Development server only; the debugger/reloader is opt-in via FLASK_DEBUG=1
+    app.run(debug=debug, port=5000, threaded=True)
\ No newline at end of file
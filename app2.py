@@ -10,16 +10,48 @@ Complete RAG System for Domain-Specific AI Insights
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from sentence_transformers import SentenceTransformer
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 import PyPDF2
+try:
+    # Optional: C-backed PDF text extraction, much faster than PyPDF2
+    import fitz
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
 import docx
 import httpx
+try:
+    # Optional: HTTP/2 multiplexing for the shared client (httpx[http2])
+    import h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 from PIL import Image
 import pytesseract
 from pdf2image import convert_from_bytes
 from pinecone import Pinecone
+try:
+    # Optional: pinecone[grpc] sends vectors as packed protobuf instead of JSON
+    from pinecone.grpc import PineconeGRPC
+    PINECONE_GRPC_AVAILABLE = True
+except ImportError:
+    PINECONE_GRPC_AVAILABLE = False
+try:
+    # Optional: BPE tokenizer for sizing the completion budget to the prompt
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+try:
+    # Optional: Rust-backed JSON, several times faster than the stdlib module
+    import orjson
+    from fastapi.responses import ORJSONResponse
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 import os
 
 # Add Poppler to PATH for PDF OCR support (Windows only)
@@ -31,10 +63,22 @@ import logging
 from typing import Optional, List, Dict
 from datetime import datetime
 from pathlib import Path
+import gzip
 import hashlib
 import io
+import asyncio
+import json
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import numpy as np
+from collections import Counter, OrderedDict
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 # Load environment variables
 load_dotenv()
@@ -52,23 +96,67 @@ class Config:
     TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY", "")
     PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
     PINECONE_ENV = os.getenv("PINECONE_ENV", "us-west1-gcp")
+    PINECONE_INDEX = os.getenv("PINECONE_INDEX", "documents-index")
     SERPER_API_KEY = os.getenv("SERPER_API_KEY", "")
     
     # Model settings
     EMBEDDING_MODEL = "paraphrase-MiniLM-L3-v2"  # Smaller, faster model
+    # Unit-length vectors, for an index created with metric="dotproduct"
+    NORMALIZE_EMBEDDINGS = os.getenv("NORMALIZE_EMBEDDINGS", "0") == "1"
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # "onnx" for ONNX Runtime on CPU
     LLM_MODEL = "meta-llama/Llama-4-Maverick-17B-128E-Instruct-FP8"  # Together AI model
     LLM_PROVIDER = "together"  # Options: "groq" or "together"
     
     # Document processing
     CHUNK_SIZE = 800
     CHUNK_OVERLAP = 100
+    OCR_DPI = 200  # Enough for body text; near-empty pages are retried at OCR_RETRY_DPI
+    OCR_RETRY_DPI = 300
+    OCR_CONFIG = "--oem 1 --psm 6"  # LSTM engine only, one uniform text block
+    OCR_MAX_SIZE = (2000, 2600)  # Larger images are downscaled before OCR
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embedding_cache.sqlite3")  # Empty to disable
+    DOC_STORE_PATH = os.getenv("DOC_STORE_PATH", "user_documents.sqlite3")  # Per-user document list
+    
+    # Vector upload
+    PINECONE_UPSERT_BATCH = int(os.getenv("PINECONE_UPSERT_BATCH", "200"))
+    INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))  # Files ingested at once by /batch-upload
+    PINECONE_MAX_REQUEST_BYTES = 2 * 1024 * 1024  # Pinecone rejects larger upserts
+    PINECONE_POOL_THREADS = 8  # Concurrent upsert requests per index
     
     # Query settings
     DEFAULT_TOP_K = 5
+    # With "0", queries that retrieve nothing (no chunks, no web results) get
+    # NO_CONTEXT_ANSWER instead of an LLM answer from general knowledge
+    ANSWER_WITHOUT_CONTEXT = os.getenv("ANSWER_WITHOUT_CONTEXT", "1") == "1"
     MAX_TOKENS = 2048  # Reduced for Render free tier (512MB RAM)
+    # Gzip LLM request bodies above this size; off unless the provider is known
+    # to accept Content-Encoding on requests
+    LLM_GZIP_MIN_BYTES = int(os.getenv("LLM_GZIP_MIN_BYTES", "0"))  # 0 disables
+    PROMPT_TOKEN_MARGIN = 256  # Slack for chat template tokens and tokenizer mismatch
+    
+    # Semantic answer cache
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_THRESHOLD = 0.95  # Min cosine similarity between queries
+    ANSWER_CACHE_MIN_OVERLAP = 0.5  # Min share of the same retrieved chunks
+    ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "answer_cache.npz")  # Empty to keep in memory only
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))  # Max age of reloaded answers, seconds
+    ANSWER_CACHE_SAVE_INTERVAL = 300  # Seconds between background saves
 
 config = Config()
 
+def json_dumps(obj) -> bytes:
+    """Serialize an outbound request body, with orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def json_loads(data):
+    """Parse a response body or event payload, with orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
 # ==================== INITIALIZATION ====================
 
 # Global variables for lazy loading
@@ -76,16 +164,133 @@ embedder = None
 text_splitter = None
 pc = None
 index = None
+embedding_cache = None
+doc_store = None
+tokenizer = None
+http_client = None
+http_client_loop = None
+embedder_lock = threading.Lock()
+pinecone_lock = threading.Lock()
+embedding_cache_lock = threading.Lock()
+doc_store_lock = threading.Lock()
+
+def load_embedder():
+    """Load the sentence transformer on the best available backend"""
+    logger.info("🔄 Loading sentence transformer model...")
+    import torch
+    if torch.cuda.is_available():
+        # Half precision on GPU; embed_texts() widens results back to float32
+        model = SentenceTransformer(config.EMBEDDING_MODEL, device="cuda")
+        model.half()
+    elif config.EMBEDDING_BACKEND == "onnx":
+        try:
+            model = SentenceTransformer(config.EMBEDDING_MODEL, backend="onnx")
+        except Exception as e:
+            logger.warning(f"⚠️ ONNX backend unavailable, using PyTorch: {str(e)}")
+            model = SentenceTransformer(config.EMBEDDING_MODEL)
+    else:
+        model = SentenceTransformer(config.EMBEDDING_MODEL)
+    logger.info(f"✅ Sentence transformer loaded on {model.device}")
+    return model
 
 def get_embedder():
-    """Lazy load embedder on first use"""
+    """Embedder, loaded on first use unless startup warm-up got there first"""
     global embedder
     if embedder is None:
-        logger.info("🔄 Loading sentence transformer model (lazy load)...")
-        embedder = SentenceTransformer(config.EMBEDDING_MODEL)
-        logger.info("✅ Sentence transformer loaded")
+        with embedder_lock:
+            if embedder is None:
+                embedder = load_embedder()
     return embedder
 
+def embedding_space() -> str:
+    """Identifies the vectors embed_texts() produces, for keying caches"""
+    return f"{config.EMBEDDING_MODEL}/normalized" if config.NORMALIZE_EMBEDDINGS else config.EMBEDDING_MODEL
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Encode texts in batched forward passes, one float32 row per text"""
+    # encode() already sorts inputs by length before batching and restores
+    # the caller's order, so batches are padded only to their own longest text
+    model = get_embedder()
+    return model.encode(
+        texts,
+        batch_size=config.EMBED_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=config.NORMALIZE_EMBEDDINGS,
+        show_progress_bar=False
+    ).astype(np.float32, copy=False)
+
+def get_embedding_cache():
+    """Lazy open the on-disk chunk embedding cache (None when disabled)"""
+    global embedding_cache
+    if embedding_cache is None and config.EMBED_CACHE_PATH:
+        with embedding_cache_lock:
+            if embedding_cache is None:
+                try:
+                    # Shared by every worker: wait on locks instead of failing at once,
+                    # and use WAL so readers don't block behind a writer
+                    db = sqlite3.connect(config.EMBED_CACHE_PATH, check_same_thread=False, timeout=10.0)
+                    db.execute("PRAGMA journal_mode=WAL")
+                    db.execute("CREATE TABLE IF NOT EXISTS emb_cache (text_hash BLOB PRIMARY KEY, vec BLOB)")
+                    db.commit()
+                    embedding_cache = db
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Embedding cache unavailable: {str(e)}")
+    return embedding_cache
+
+def embed_chunks(chunks: List[str]) -> np.ndarray:
+    """Embed document chunks, reusing cached vectors for chunk texts seen before"""
+    db = get_embedding_cache()
+    if db is None:
+        return embed_texts(chunks)
+    
+    keys = [hashlib.blake2b(f"{embedding_space()}\0{chunk}".encode(), digest_size=16).digest()
+            for chunk in chunks]
+    cached = {}
+    try:
+        with embedding_cache_lock:
+            for i in range(0, len(keys), 500):  # Stay under SQLite's bound-parameter limit
+                part = keys[i:i + 500]
+                cached.update(db.execute(
+                    f"SELECT text_hash, vec FROM emb_cache WHERE text_hash IN ({','.join('?' * len(part))})",
+                    part
+                ).fetchall())
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Embedding cache read failed, embedding without it: {str(e)}")
+        return embed_texts(chunks)
+    
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    rows = [None] * len(chunks)
+    if missing:
+        fresh = embed_texts([chunks[i] for i in missing])
+        for row, i in zip(fresh, missing):
+            rows[i] = row
+        with embedding_cache_lock:
+            try:
+                db.executemany(
+                    "INSERT OR REPLACE INTO emb_cache VALUES (?, ?)",
+                    [(keys[i], rows[i].tobytes()) for i in missing]
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                # The vectors are already computed; only caching them is lost
+                db.rollback()
+                logger.warning(f"⚠️ Embedding cache write failed: {str(e)}")
+    logger.info("Embedding cache: %s/%s chunks reused", len(chunks) - len(missing), len(chunks))
+    
+    for i, key in enumerate(keys):
+        if rows[i] is None:
+            rows[i] = np.frombuffer(cached[key], dtype=np.float32)
+    return np.vstack(rows)
+
+@lru_cache(maxsize=2048)
+def _embed_query(space: str, text: str) -> tuple:
+    """Query embedding memoized per (embedding space, text); space only keys the cache"""
+    return tuple(embed_texts([text])[0].tolist())
+
+def embed_query(text: str) -> List[float]:
+    """Embedding for a search query, reused across repeated queries"""
+    return list(_embed_query(embedding_space(), text))
+
 def get_text_splitter():
     """Lazy load text splitter on first use"""
     global text_splitter
@@ -99,29 +304,76 @@ def get_text_splitter():
         logger.info("✅ Text splitter initialized")
     return text_splitter
 
+def get_http_client() -> httpx.AsyncClient:
+    """Shared AsyncClient so LLM and search calls reuse warm keep-alive connections"""
+    global http_client, http_client_loop
+    # Connections belong to the event loop they were opened on; scripts that
+    # call asyncio.run() repeatedly get a fresh client per loop
+    loop = asyncio.get_running_loop()
+    if http_client is None or http_client.is_closed or http_client_loop is not loop:
+        http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=60.0,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
+        http_client_loop = loop
+    return http_client
+
+def pinecone_result(request):
+    """Wait for a Pinecone call made with async_req=True"""
+    # gRPC returns futures, REST returns ApplyResult
+    return request.result() if PINECONE_GRPC_AVAILABLE else request.get()
+
 def get_pinecone_index():
     """Lazy load Pinecone on first use"""
     global pc, index
     if index is None and config.PINECONE_API_KEY:
-        logger.info("🔄 Connecting to Pinecone...")
-        try:
-            pc = Pinecone(api_key=config.PINECONE_API_KEY)
-            index = pc.Index("documents-index")
-            logger.info("✅ Pinecone connected")
-        except Exception as e:
-            logger.error(f"⚠️ Pinecone connection failed: {str(e)}")
-            raise HTTPException(status_code=503, detail="Vector database unavailable")
+        with pinecone_lock:
+            if index is None:
+                logger.info("🔄 Connecting to Pinecone...")
+                try:
+                    pc = (PineconeGRPC if PINECONE_GRPC_AVAILABLE else Pinecone)(api_key=config.PINECONE_API_KEY)
+                    index = pc.Index(config.PINECONE_INDEX, pool_threads=config.PINECONE_POOL_THREADS)
+                    logger.info("✅ Pinecone connected")
+                except Exception as e:
+                    logger.error(f"⚠️ Pinecone connection failed: {str(e)}")
+                    raise HTTPException(status_code=503, detail="Vector database unavailable")
     return index
 
+async def warm_up():
+    """Load the embedder, text splitter and Pinecone index concurrently"""
+    loaders = [get_embedder, get_text_splitter]
+    if config.PINECONE_API_KEY:
+        loaders.append(get_pinecone_index)
+    results = await asyncio.gather(*(asyncio.to_thread(load) for load in loaders), return_exceptions=True)
+    for load, result in zip(loaders, results):
+        if isinstance(result, Exception):
+            logger.warning(f"⚠️ Warm-up of {load.__name__} failed, will retry on first use: {str(result)}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager - server starts immediately"""
     logger.info("✅ Backend fully started and ready to serve requests.")
     logger.info(f"📝 MAX_TOKENS: {config.MAX_TOKENS} (optimized for Render free tier)")
+    # Warm up models in the background so the first request skips the cold
+    # start without delaying the port bind
+    warmup = asyncio.create_task(warm_up())
+    await asyncio.to_thread(load_answer_cache)
+    autosave = asyncio.create_task(save_answer_cache_periodically())
     yield
+    warmup.cancel()
+    autosave.cancel()
+    await asyncio.to_thread(save_answer_cache)
+    if http_client is not None and http_client_loop is asyncio.get_running_loop():
+        await http_client.aclose()
     logger.info("Shutting down...")
 
-app = FastAPI(title="RAG Backend API", version="1.0.0", lifespan=lifespan)
+app = FastAPI(
+    title="RAG Backend API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -168,12 +420,60 @@ class IngestionResponse(BaseModel):
 def extract_text_with_ocr(image) -> str:
     """Extract text from image using OCR"""
     try:
-        text = pytesseract.image_to_string(image, lang='eng')
+        if image.width > config.OCR_MAX_SIZE[0] or image.height > config.OCR_MAX_SIZE[1]:
+            image = image.copy()
+            image.thumbnail(config.OCR_MAX_SIZE, Image.LANCZOS)
+        text = pytesseract.image_to_string(image, lang='eng', config=config.OCR_CONFIG)
         return text.strip()
     except Exception as e:
         logger.warning(f"OCR failed: {str(e)}")
         return ""
 
+def ocr_images(images) -> List[str]:
+    """OCR page images concurrently, returning text in page order"""
+    # pytesseract runs the tesseract binary per image, so threads give
+    # process-level parallelism without pickling the rendered pages
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        return list(pool.map(extract_text_with_ocr, images))
+
+def page_runs(page_nums: List[int]) -> List[List[int]]:
+    """Group sorted page numbers into runs of consecutive pages"""
+    runs = []
+    for page_num in page_nums:
+        if runs and runs[-1][-1] == page_num - 1:
+            runs[-1].append(page_num)
+        else:
+            runs.append([page_num])
+    return runs
+
+def ocr_pdf_pages(file_content: bytes, first_page: int, last_page: Optional[int] = None) -> List[str]:
+    """
+    Render and OCR PDF pages first_page..last_page (1-based; to the end if None)
+    Pages that come back nearly empty get a second pass at higher resolution
+    """
+    images = convert_from_bytes(
+        file_content,
+        first_page=first_page,
+        last_page=last_page,
+        dpi=config.OCR_DPI,
+        thread_count=os.cpu_count() or 1
+    )
+    texts = ocr_images(images)
+    
+    if config.OCR_RETRY_DPI > config.OCR_DPI:
+        for run in page_runs([i for i, text in enumerate(texts) if len(text) < 50]):
+            images = convert_from_bytes(
+                file_content,
+                first_page=first_page + run[0],
+                last_page=first_page + run[-1],
+                dpi=config.OCR_RETRY_DPI,
+                thread_count=os.cpu_count() or 1
+            )
+            for i, text in zip(run, ocr_images(images)):
+                if len(text) > len(texts[i]):
+                    texts[i] = text
+    return texts
+
 def extract_text_from_file(file_content: bytes, filename: str, use_ocr: bool = True) -> str:
     """Extract text from PDF, DOCX, or TXT files with OCR support"""
     ext = Path(filename).suffix.lower()
@@ -181,47 +481,39 @@ def extract_text_from_file(file_content: bytes, filename: str, use_ocr: bool = T
     try:
         if ext == '.pdf':
             # Try standard text extraction first
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            text_parts = []
+            if PYMUPDF_AVAILABLE:
+                with fitz.open(stream=file_content, filetype="pdf") as pdf:
+                    page_texts = [page.get_text("text") for page in pdf]
+            else:
+                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+                page_texts = [page.extract_text() or "" for page in pdf_reader.pages]
             
-            for page_num, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                
-                # If page has little or no text, try OCR
-                if use_ocr and (not page_text or len(page_text.strip()) < 50):
-                    logger.info(f"Page {page_num + 1} has minimal text, attempting OCR...")
-                    try:
-                        # Convert PDF page to image
-                        images = convert_from_bytes(
-                            file_content,
-                            first_page=page_num + 1,
-                            last_page=page_num + 1,
-                            dpi=300
-                        )
-                        if images:
-                            ocr_text = extract_text_with_ocr(images[0])
-                            if ocr_text:
-                                page_text = ocr_text
-                                logger.info(f"OCR extracted {len(ocr_text)} characters from page {page_num + 1}")
-                    except Exception as e:
-                        logger.warning(f"OCR failed for page {page_num + 1}: {str(e)}")
-                
-                if page_text:
-                    text_parts.append(page_text)
+            # Pages with little or no text get OCR; each run of consecutive
+            # pages is rendered with one Poppler call instead of one per page
+            ocr_needed = [n for n, t in enumerate(page_texts) if len(t.strip()) < 50] if use_ocr else []
+            logger.info("%s: text layer on %s/%s pages, %s need OCR", filename, len(page_texts) - len(ocr_needed), len(page_texts), len(ocr_needed))
+            ocr_chars = 0
+            for run in page_runs(ocr_needed):
+                try:
+                    for page_num, ocr_text in zip(run, ocr_pdf_pages(file_content, run[0] + 1, run[-1] + 1)):
+                        if ocr_text:
+                            page_texts[page_num] = ocr_text
+                            ocr_chars += len(ocr_text)
+                except Exception as e:
+                    logger.warning(f"OCR failed for pages {run[0] + 1}-{run[-1] + 1}: {str(e)}")
+            if ocr_needed:
+                logger.info("OCR extracted %s characters from %s pages", ocr_chars, len(ocr_needed))
+            
+            text_parts = [t for t in page_texts if t]
             
             full_text = "\n\n".join(text_parts)
             
-            # If still no text, try OCR on entire PDF
-            if use_ocr and len(full_text.strip()) < 100:
+            # If still no text, try OCR on entire PDF (unless every page was just OCR'd)
+            if use_ocr and len(full_text.strip()) < 100 and len(ocr_needed) < len(page_texts):
                 logger.info("Minimal text extracted, attempting full PDF OCR...")
                 try:
-                    images = convert_from_bytes(file_content, dpi=300)
-                    ocr_parts = []
-                    for i, image in enumerate(images):
-                        ocr_text = extract_text_with_ocr(image)
-                        if ocr_text:
-                            ocr_parts.append(ocr_text)
-                            logger.info(f"OCR page {i + 1}: {len(ocr_text)} characters")
+                    ocr_parts = [ocr_text for ocr_text in ocr_pdf_pages(file_content, 1) if ocr_text]
+                    logger.info("Full PDF OCR: %s characters from %s pages", sum(map(len, ocr_parts)), len(ocr_parts))
                     if ocr_parts:
                         full_text = "\n\n".join(ocr_parts)
                 except Exception as e:
@@ -234,7 +526,8 @@ def extract_text_from_file(file_content: bytes, filename: str, use_ocr: bool = T
             return "\n\n".join(para.text for para in doc.paragraphs if para.text.strip())
         
         elif ext == '.txt':
-            return file_content.decode('utf-8')
+            # str() rather than .decode() so memory-mapped files work too
+            return str(file_content, 'utf-8')
         
         elif ext in ['.png', '.jpg', '.jpeg', '.tiff', '.bmp']:
             # Direct image file - use OCR
@@ -251,42 +544,213 @@ def extract_text_from_file(file_content: bytes, filename: str, use_ocr: bool = T
         logger.error(f"Text extraction failed: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Failed to extract text: {str(e)}")
 
-def chunk_and_embed(text: str, filename: str, domain: str, user_id: Optional[str] = None) -> List[Dict]:
-    """Split text into chunks and create embeddings"""
+def iter_chunk_vectors(text: str, filename: str, domain: str, user_id: Optional[str] = None,
+                       group_size: int = 0):
+    """
+    Split text into chunks and yield embedded vectors group by group
+    Lets the caller upload one group while the next is being encoded
+    """
     splitter = get_text_splitter()
     chunks = splitter.split_text(text)
-    logger.info(f"Created {len(chunks)} chunks from {filename}")
+    logger.info("Created %s chunks from %s", len(chunks), filename)
     
-    vectors = []
-    model = get_embedder()
-    for i, chunk in enumerate(chunks):
-        embedding = model.encode(chunk).tolist()
-        doc_id = hashlib.md5(f"{user_id}_{filename}_{i}".encode()).hexdigest() if user_id else hashlib.md5(f"{filename}_{i}".encode()).hexdigest()
-        
-        metadata = {
-            "text": chunk,
-            "source": filename,
-            "domain": domain,
-            "chunk_index": i,
-            "total_chunks": len(chunks),
-            "timestamp": datetime.now().isoformat(),
-            "type": "document"  # Mark as user document vs query
-        }
-        
-        # Add user_id if provided
-        if user_id:
-            metadata["user_id"] = user_id
-        
-        vectors.append({
-            "id": doc_id,
-            "values": embedding,
-            "metadata": metadata
-        })
+    # Vector IDs stay md5 of "[user_id_]filename_i" so re-uploads overwrite
+    # earlier vectors; the shared prefix is hashed once
+    prefix = f"{user_id}_{filename}_" if user_id else f"{filename}_"
+    id_prefix = hashlib.md5(prefix.encode(), usedforsecurity=False)
+    def id_hasher(suffix: str) -> str:
+        h = id_prefix.copy()
+        h.update(suffix.encode())
+        return h.hexdigest()
+    
+    group_size = group_size or len(chunks) or 1
+    for start in range(0, len(chunks), group_size):
+        group = chunks[start:start + group_size]
+        embeddings = embed_chunks(group)
+        vectors = []
+        for i, chunk in enumerate(group, start):
+            embedding = embeddings[i - start].tolist()
+            doc_id = id_hasher(str(i))
+            
+            metadata = {
+                "text": chunk,
+                "source": filename,
+                "domain": domain,
+                "chunk_index": i,
+                "total_chunks": len(chunks),
+                "timestamp": datetime.now().isoformat(),
+                "type": "document"  # Mark as user document vs query
+            }
+            
+            # Add user_id if provided
+            if user_id:
+                metadata["user_id"] = user_id
+            
+            vectors.append({
+                "id": doc_id,
+                "values": embedding,
+                "metadata": metadata
+            })
+        yield vectors
+
+def chunk_and_embed(text: str, filename: str, domain: str, user_id: Optional[str] = None) -> List[Dict]:
+    """Split text into chunks and create embeddings"""
+    return [vector for group in iter_chunk_vectors(text, filename, domain, user_id) for vector in group]
+
+def batch_vectors(vectors: List[Dict], batch_size: int):
+    """Split vectors into upsert batches that stay under the request size limit"""
+    batch, batch_bytes = [], 0
+    for vector in vectors:
+        # Serialized floats take ~20 bytes each; metadata is mostly the chunk text
+        size = len(vector["values"]) * 20 + len(vector["metadata"].get("text", "")) + 512
+        if batch and (len(batch) >= batch_size or batch_bytes + size > config.PINECONE_MAX_REQUEST_BYTES):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+class VectorUploader:
+    """
+    Packs vectors from one or more documents into full upsert batches
+    Batches go out in the background as soon as they fill, so small files
+    uploaded together share requests instead of sending one each
+    """
+    
+    def __init__(self, idx, batch_size: int):
+        self.idx = idx
+        self.batch_size = batch_size
+        self.buffer = []
+        self.pending = []
+        self.sent_ids = []  # IDs handed to Pinecone, for discard()
+        self.lock = threading.Lock()
+    
+    def _send(self, vectors: List[Dict]):
+        # Caller holds self.lock
+        self.sent_ids.extend(vector["id"] for vector in vectors)
+        self.pending.extend(
+            self.idx.upsert(vectors=batch, async_req=True)
+            for batch in batch_vectors(vectors, self.batch_size)
+        )
     
-    return vectors
+    def add(self, vectors: List[Dict]):
+        with self.lock:
+            self.buffer.extend(vectors)
+            if len(self.buffer) >= self.batch_size:
+                full = len(self.buffer) - len(self.buffer) % self.batch_size
+                self._send(self.buffer[:full])
+                del self.buffer[:full]
+    
+    def flush(self):
+        """Send what is left and wait until every upsert has been applied"""
+        with self.lock:
+            if self.buffer:
+                self._send(self.buffer)
+                self.buffer = []
+            pending, self.pending = self.pending, []
+        for request in pending:
+            pinecone_result(request)
+    
+    def discard(self):
+        """Drop unsent vectors and delete the ones already sent, once their upserts settle"""
+        with self.lock:
+            self.buffer = []
+            pending, self.pending = self.pending, []
+            sent_ids, self.sent_ids = self.sent_ids, []
+        for request in pending:
+            try:
+                pinecone_result(request)
+            except Exception:
+                pass  # Nothing written by this request, nothing to delete
+        for start in range(0, len(sent_ids), 1000):  # Pinecone deletes at most 1000 IDs per call
+            self.idx.delete(ids=sent_ids[start:start + 1000])
+
+def get_doc_store():
+    """Lazy open the user document metadata store (None when disabled)"""
+    global doc_store
+    if doc_store is None and config.DOC_STORE_PATH:
+        with doc_store_lock:
+            if doc_store is None:
+                try:
+                    db = sqlite3.connect(config.DOC_STORE_PATH, check_same_thread=False)
+                    db.execute(
+                        "CREATE TABLE IF NOT EXISTS user_docs ("
+                        "user_id TEXT, source TEXT, chunks INT, timestamp TEXT, "
+                        "PRIMARY KEY (user_id, source))"
+                    )
+                    # Users whose pre-store uploads have been merged in from Pinecone
+                    db.execute("CREATE TABLE IF NOT EXISTS user_docs_backfilled (user_id TEXT PRIMARY KEY)")
+                    db.commit()
+                    doc_store = db
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Document store unavailable: {str(e)}")
+    return doc_store
+
+def record_user_document(user_id: str, source: str, chunks: int):
+    """Record an uploaded document so listing it needs no Pinecone query"""
+    db = get_doc_store()
+    if db is None:
+        return
+    # Re-uploads overwrite vectors by chunk index, so the index holds the
+    # larger of the old and new chunk counts
+    with doc_store_lock:
+        db.execute(
+            "INSERT INTO user_docs VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, source) DO UPDATE SET "
+            "chunks = MAX(chunks, excluded.chunks), timestamp = excluded.timestamp",
+            (user_id, source, chunks, datetime.now().isoformat())
+        )
+        db.commit()
+
+def list_user_documents(user_id: str) -> Optional[List[Dict]]:
+    """Documents recorded for a user, or None when the store is disabled"""
+    db = get_doc_store()
+    if db is None:
+        return None
+    with doc_store_lock:
+        rows = db.execute(
+            "SELECT source, chunks, timestamp FROM user_docs WHERE user_id = ? ORDER BY timestamp",
+            (user_id,)
+        ).fetchall()
+    return [
+        {"filename": source, "chunks": chunks, "timestamp": timestamp}
+        for source, chunks, timestamp in rows
+    ]
 
-def ingest_document(file_content: bytes, filename: str, domain: str, user_id: Optional[str] = None) -> Dict:
-    """Complete document ingestion pipeline"""
+def user_documents_backfilled(user_id: str) -> bool:
+    """Whether the store lists every document of the user, including pre-store uploads"""
+    db = get_doc_store()
+    if db is None:
+        return False
+    with doc_store_lock:
+        return db.execute(
+            "SELECT 1 FROM user_docs_backfilled WHERE user_id = ?", (user_id,)
+        ).fetchone() is not None
+
+def backfill_user_documents(user_id: str, documents: List[Dict]) -> List[Dict]:
+    """
+    Merge documents found in Pinecone into the store and mark the user as
+    fully recorded; returns the merged listing
+    """
+    db = get_doc_store()
+    with doc_store_lock:
+        db.executemany(
+            "INSERT INTO user_docs VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, source) DO UPDATE SET chunks = MAX(chunks, excluded.chunks)",
+            [(user_id, doc["filename"], doc["chunks"], doc["timestamp"]) for doc in documents]
+        )
+        db.execute("INSERT OR IGNORE INTO user_docs_backfilled VALUES (?)", (user_id,))
+        db.commit()
+    return list_user_documents(user_id)
+
+def ingest_document(file_content: bytes, filename: str, domain: str, user_id: Optional[str] = None,
+                    uploader: Optional[VectorUploader] = None) -> Dict:
+    """
+    Complete document ingestion pipeline
+    With a shared uploader the caller flushes it, then calls
+    record_user_document() for each file once its vectors are stored
+    """
     start_time = datetime.now()
     
     # Extract text
@@ -295,23 +759,44 @@ def ingest_document(file_content: bytes, filename: str, domain: str, user_id: Op
     if not text.strip():
         raise HTTPException(status_code=400, detail="No text content found in document")
     
-    # Create chunks and embeddings with user_id
-    vectors = chunk_and_embed(text, filename, domain, user_id)
+    shared = uploader is not None
+    if not shared:
+        uploader = VectorUploader(get_pinecone_index(), config.PINECONE_UPSERT_BATCH)
     
-    # Get Pinecone index
-    idx = get_pinecone_index()
+    # Embed chunks group by group; each full batch is upserted in the
+    # background while the next group is encoded. A shared uploader only
+    # gets this file's vectors once all of them are embedded, so a file
+    # failing partway leaves no orphan chunks in the other files' batches
+    chunks_created = 0
+    file_vectors = []
+    try:
+        for vectors in iter_chunk_vectors(text, filename, domain, user_id, config.PINECONE_UPSERT_BATCH):
+            chunks_created += len(vectors)
+            if shared:
+                file_vectors.extend(vectors)
+            else:
+                uploader.add(vectors)
+        if not shared:
+            uploader.flush()
+    except Exception:
+        # Don't leave part of the file in the index
+        if not shared:
+            try:
+                uploader.discard()
+            except Exception as e:
+                logger.error(f"Failed to remove partial upload of {filename}: {str(e)}")
+        raise
     
-    # Upload to Pinecone in batches
-    batch_size = 100
-    for i in range(0, len(vectors), batch_size):
-        batch = vectors[i:i + batch_size]
-        idx.upsert(vectors=batch)
+    if shared:
+        uploader.add(file_vectors)
+    elif user_id:
+        record_user_document(user_id, filename, chunks_created)
     
     processing_time = (datetime.now() - start_time).total_seconds()
     
     return {
         "status": "success",
-        "chunks_created": len(vectors),
+        "chunks_created": chunks_created,
         "processing_time": processing_time,
         "file_name": filename,
         "user_id": user_id
@@ -319,35 +804,56 @@ def ingest_document(file_content: bytes, filename: str, domain: str, user_id: Op
 
 # ==================== DOMAIN & INTENT DETECTION ====================
 
+# Real estate keywords
+REAL_ESTATE_KEYWORDS = [
+    'property', 'real estate', 'housing', 'rental', 'rent', 'apartment', 'condo',
+    'mortgage', 'home price', 'house price', 'property market', 'residential',
+    'commercial property', 'investment property', 'real estate market',
+    'housing demand', 'housing supply', 'property value', 'property investment',
+    'real estate trend', 'property price', 'housing market', 'realty',
+    'land', 'plot', 'villa', 'penthouse', 'square feet', 'sqft',
+    'builder', 'developer', 'construction', 'emi', 'down payment'
+]
+
+# Travel keywords
+TRAVEL_KEYWORDS = [
+    'travel', 'trip', 'vacation', 'holiday', 'tour', 'flight', 'hotel',
+    'visa', 'passport', 'destination', 'tourism', 'tourist', 'itinerary',
+    'booking', 'airline', 'airport', 'train', 'rail', 'bus', 'road trip',
+    'backpack', 'cruise', 'resort', 'accommodation', 'sightseeing',
+    'adventure', 'explore', 'visit', 'journey', 'cultural', 'festival',
+    'weather', 'season', 'budget travel', 'luxury travel', 'solo travel',
+    'family vacation', 'honeymoon', 'weekend getaway', 'pilgrimage'
+]
+
+# Intent keywords, checked in priority order
+INTENT_KEYWORDS = [
+    ('visa_info', ['visa', 'passport', 'document', 'requirement', 'application']),
+    ('hotel_search', ['hotel', 'accommodation', 'stay', 'lodge', 'resort']),
+    ('flight_search', ['flight', 'airline', 'fly', 'ticket', 'booking']),
+    ('weather', ['weather', 'temperature', 'climate', 'season', 'rain']),
+    ('itinerary', ['itinerary', 'plan', 'schedule', 'trip plan', 'day by day']),
+    ('travel_tips', ['tip', 'advice', 'guide', 'safety', 'custom', 'culture']),
+    ('destination_info', ['attraction', 'place', 'visit', 'destination', 'city', 'country'])
+]
+
+FRESH_KEYWORDS = ['latest', 'current', 'recent', 'today', 'now', 'new', '2025', '2024']
+
+def _keyword_regex(keywords: List[str]) -> re.Pattern:
+    """One alternation over all keywords, longest first so phrases win over their parts"""
+    return re.compile("|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)))
+
+_INTENT_RES = [(intent, _keyword_regex(keywords)) for intent, keywords in INTENT_KEYWORDS]
+_FRESH_RE = _keyword_regex(FRESH_KEYWORDS)
+
 def detect_domain(query: str) -> str:
     """Automatically detect if query is about travel or real estate"""
     query_lower = query.lower()
     
-    # Real estate keywords
-    real_estate_keywords = [
-        'property', 'real estate', 'housing', 'rental', 'rent', 'apartment', 'condo',
-        'mortgage', 'home price', 'house price', 'property market', 'residential',
-        'commercial property', 'investment property', 'real estate market',
-        'housing demand', 'housing supply', 'property value', 'property investment',
-        'real estate trend', 'property price', 'housing market', 'realty',
-        'land', 'plot', 'villa', 'penthouse', 'square feet', 'sqft',
-        'builder', 'developer', 'construction', 'emi', 'down payment'
-    ]
-    
-    # Travel keywords
-    travel_keywords = [
-        'travel', 'trip', 'vacation', 'holiday', 'tour', 'flight', 'hotel',
-        'visa', 'passport', 'destination', 'tourism', 'tourist', 'itinerary',
-        'booking', 'airline', 'airport', 'train', 'rail', 'bus', 'road trip',
-        'backpack', 'cruise', 'resort', 'accommodation', 'sightseeing',
-        'adventure', 'explore', 'visit', 'journey', 'cultural', 'festival',
-        'weather', 'season', 'budget travel', 'luxury travel', 'solo travel',
-        'family vacation', 'honeymoon', 'weekend getaway', 'pilgrimage'
-    ]
-    
-    # Count matches
-    real_estate_score = sum(1 for keyword in real_estate_keywords if keyword in query_lower)
-    travel_score = sum(1 for keyword in travel_keywords if keyword in query_lower)
+    # Count distinct keywords present; overlapping phrases ('real estate'
+    # inside 'real estate market') each count, repeats do not
+    real_estate_score = sum(1 for keyword in REAL_ESTATE_KEYWORDS if keyword in query_lower)
+    travel_score = sum(1 for keyword in TRAVEL_KEYWORDS if keyword in query_lower)
     
     # Determine domain
     if real_estate_score > travel_score:
@@ -362,28 +868,14 @@ def detect_intent(query: str) -> str:
     """Simple intent detection based on keywords"""
     query_lower = query.lower()
     
-    # Intent keywords
-    if any(word in query_lower for word in ['visa', 'passport', 'document', 'requirement', 'application']):
-        return 'visa_info'
-    elif any(word in query_lower for word in ['hotel', 'accommodation', 'stay', 'lodge', 'resort']):
-        return 'hotel_search'
-    elif any(word in query_lower for word in ['flight', 'airline', 'fly', 'ticket', 'booking']):
-        return 'flight_search'
-    elif any(word in query_lower for word in ['weather', 'temperature', 'climate', 'season', 'rain']):
-        return 'weather'
-    elif any(word in query_lower for word in ['itinerary', 'plan', 'schedule', 'trip plan', 'day by day']):
-        return 'itinerary'
-    elif any(word in query_lower for word in ['tip', 'advice', 'guide', 'safety', 'custom', 'culture']):
-        return 'travel_tips'
-    elif any(word in query_lower for word in ['attraction', 'place', 'visit', 'destination', 'city', 'country']):
-        return 'destination_info'
-    else:
-        return 'general'
+    for intent, pattern in _INTENT_RES:
+        if pattern.search(query_lower):
+            return intent
+    return 'general'
 
 def needs_web_search(query: str) -> bool:
     """Detect if query needs fresh information"""
-    fresh_keywords = ['latest', 'current', 'recent', 'today', 'now', 'new', '2025', '2024']
-    return any(kw in query.lower() for kw in fresh_keywords)
+    return _FRESH_RE.search(query.lower()) is not None
 
 def create_enhanced_search_query(original_query: str, doc_context: List[Dict]) -> str:
     """Create enhanced search query using document context"""
@@ -404,7 +896,7 @@ def create_enhanced_search_query(original_query: str, doc_context: List[Dict]) -
         
         # Create enhanced query
         enhanced_query = f"{original_query} {context_text[:150]}"
-        logger.info(f"Enhanced query: {enhanced_query[:100]}...")
+        logger.info("Enhanced query: %s...", enhanced_query[:100])
         return enhanced_query
     
     return original_query
@@ -421,35 +913,37 @@ async def search_web(query: str, doc_context: List[Dict] = None) -> List[Dict]:
         if doc_context:
             search_query = create_enhanced_search_query(query, doc_context)
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                "https://google.serper.dev/search",
-                headers={"X-API-KEY": config.SERPER_API_KEY},
-                json={"q": search_query, "num": 5}
-            )
-            
-            if response.status_code != 200:
-                return []
-            
-            results = response.json()
-            return [
-                {
-                    "title": r.get("title", ""),
-                    "snippet": r.get("snippet", ""),
-                    "url": r.get("link", "")
-                }
-                for r in results.get("organic", [])[:3]
-            ]
+        client = get_http_client()
+        response = await client.post(
+            "https://google.serper.dev/search",
+            headers={"X-API-KEY": config.SERPER_API_KEY, "Content-Type": "application/json"},
+            content=json_dumps({"q": search_query, "num": 5}),
+            timeout=10.0
+        )
+        
+        if response.status_code != 200:
+            return []
+        
+        results = json_loads(response.content)
+        return [
+            {
+                "title": r.get("title", ""),
+                "snippet": r.get("snippet", ""),
+                "url": r.get("link", "")
+            }
+            for r in results.get("organic", [])[:3]
+        ]
     except Exception as e:
         logger.error(f"Web search failed: {str(e)}")
         return []
 
-def retrieve_documents(query: str, domain: Optional[str], top_k: int = 5, user_id: Optional[str] = None, include_reports: bool = True) -> List[Dict]:
+def retrieve_documents(query: str, domain: Optional[str], top_k: int = 5, user_id: Optional[str] = None, include_reports: bool = True,
+                       query_embedding: Optional[List[float]] = None) -> List[Dict]:
     """Retrieve relevant documents from vector DB with optional user filtering and reports namespace"""
     try:
-        # Generate query embedding
-        model = get_embedder()
-        query_embedding = model.encode(query).tolist()
+        # Generate query embedding unless the caller already has it
+        if query_embedding is None:
+            query_embedding = embed_query(query)
         
         # Build filter
         filter_dict = {}
@@ -467,28 +961,34 @@ def retrieve_documents(query: str, domain: Optional[str], top_k: int = 5, user_i
         # Get Pinecone index
         idx = get_pinecone_index()
         
-        # Query default namespace (user documents)
-        results_default = idx.query(
+        # Query default namespace (user documents) and, if enabled, the
+        # reports namespace concurrently
+        request_default = idx.query(
             vector=query_embedding,
             top_k=retrieval_k,
             include_metadata=True,
             filter=filter_dict if filter_dict else None,
-            namespace=""  # Default namespace
+            namespace="",  # Default namespace
+            async_req=True
         )
-        
-        all_matches = results_default.get("matches", [])
-        
-        # Also query reports namespace if enabled
+        request_reports = None
         if include_reports:
-            results_reports = idx.query(
+            request_reports = idx.query(
                 vector=query_embedding,
                 top_k=retrieval_k // 2,  # Get fewer from reports
                 include_metadata=True,
                 filter={"domain": domain} if domain else None,
-                namespace="reports"  # Reports namespace
+                namespace="reports",  # Reports namespace
+                async_req=True
             )
-            all_matches.extend(results_reports.get("matches", []))
-            logger.info(f"Retrieved {len(results_default.get('matches', []))} from default namespace, {len(results_reports.get('matches', []))} from reports namespace")
+        
+        all_matches = list(pinecone_result(request_default).get("matches", []))
+        
+        if request_reports is not None:
+            default_count = len(all_matches)
+            reports_matches = pinecone_result(request_reports).get("matches", [])
+            all_matches.extend(reports_matches)
+            logger.info("Retrieved %s from default namespace, %s from reports namespace", default_count, len(reports_matches))
         
         # Sort all matches by score
         all_matches.sort(key=lambda x: x["score"], reverse=True)
@@ -497,42 +997,35 @@ def retrieve_documents(query: str, domain: Optional[str], top_k: int = 5, user_i
         # Diversify results to include chunks from different source documents
         matches = results.get("matches", [])[:retrieval_k * 2]  # Limit before diversification
         
-        # Group by source document
-        by_source = {}
-        for match in matches:
-            source = match["metadata"].get("source", "unknown")
-            if source not in by_source:
-                by_source[source] = []
-            by_source[source].append(match)
+        # Source of each match, looked up once and reused by both passes below
+        sources = [match["metadata"].get("source", "unknown") for match in matches]
+        source_counts = Counter(sources)
         
-        logger.info(f"Found {len(by_source)} unique source documents")
+        logger.info("Found %s unique source documents", len(source_counts))
         
         # Strategy: Ensure we get chunks from ALL different documents
         # If we have 3 documents and top_k=5, get at least 1-2 chunks from each document
-        diverse_matches = []
+        final_matches = []
         
-        if len(by_source) > 0:
+        if source_counts:
             # Calculate how many chunks to take from each source
-            chunks_per_source = max(1, top_k // len(by_source))
-            remaining_slots = top_k - (chunks_per_source * len(by_source))
-            
-            # First pass: Take equal chunks from each source
-            for source, source_matches in by_source.items():
-                diverse_matches.extend(source_matches[:chunks_per_source])
+            chunks_per_source = max(1, top_k // len(source_counts))
+            remaining_slots = top_k - (chunks_per_source * len(source_counts))
             
-            # Second pass: Fill remaining slots with highest scoring chunks
-            if remaining_slots > 0:
-                all_remaining = []
-                for source, source_matches in by_source.items():
-                    all_remaining.extend(source_matches[chunks_per_source:])
-                all_remaining.sort(key=lambda x: x["score"], reverse=True)
-                diverse_matches.extend(all_remaining[:remaining_slots])
+            # Single pass in score order: each source's best chunks_per_source
+            # matches, plus the highest scoring extras for the remaining slots
+            taken = Counter()
+            for match, source in zip(matches, sources):
+                if taken[source] >= chunks_per_source:
+                    if remaining_slots <= 0:
+                        continue
+                    remaining_slots -= 1
+                taken[source] += 1
+                final_matches.append(match)
         
-        # Sort by score
-        diverse_matches.sort(key=lambda x: x["score"], reverse=True)
-        final_matches = diverse_matches[:top_k]
+        final_matches = final_matches[:top_k]
         
-        logger.info(f"Retrieved {len(final_matches)} chunks from {len(by_source)} different source documents")
+        logger.info("Retrieved %s chunks from %s different source documents", len(final_matches), len(source_counts))
         
         return [
             {
@@ -552,13 +1045,253 @@ def retrieve_documents(query: str, domain: Optional[str], top_k: int = 5, user_i
 
 # ==================== LLM GENERATION ====================
 
-async def generate_answer(query: str, doc_results: List[Dict], web_results: Optional[List[Dict]] = None, llm_provider: str = "together") -> str:
-    """Generate analytical, synthesized answer using Together AI or Groq"""
+class SemanticCache:
+    """
+    LLM answers keyed by query meaning
+    A hit needs a near-identical query embedding and mostly the same
+    retrieved chunks, so an answer is never reused for different context.
+    Embeddings live in one preallocated matrix scored with a single matmul;
+    slots are recycled least recently used first
+    """
+    
+    def __init__(self, max_entries: int, threshold: float, min_overlap: float):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.vectors = None  # (max_entries, dim) float32, allocated on first store
+        self.entries = OrderedDict()  # slot -> (scope, source_ids, answer, created), LRU order
+        self.dirty = False  # Changed since the last save
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+    
+    def lookup(self, query_vector: List[float], scope, source_ids: frozenset) -> Optional[str]:
+        """Cached answer for a similar query over similar sources, or None"""
+        with self.lock:
+            if not self.entries:
+                return None
+            sims = self.vectors[:len(self.entries)] @ self._unit(query_vector)
+            candidates = np.flatnonzero(sims >= self.threshold)
+            for slot in candidates[np.argsort(-sims[candidates])].tolist():
+                entry_scope, entry_sources, answer, _ = self.entries[slot]
+                if entry_scope != scope:
+                    continue
+                union = len(entry_sources | source_ids)
+                if union and len(entry_sources & source_ids) / union < self.min_overlap:
+                    continue
+                self.entries.move_to_end(slot)
+                return answer
+        return None
+    
+    def _insert(self, vec: np.ndarray, scope, source_ids: frozenset, answer: str, created: float):
+        # Caller holds self.lock
+        if self.vectors is None:
+            self.vectors = np.zeros((self.max_entries, len(vec)), dtype=np.float32)
+        if len(self.entries) < self.max_entries:
+            slot = len(self.entries)
+        else:
+            slot, _ = self.entries.popitem(last=False)
+        self.vectors[slot] = vec
+        self.entries[slot] = (scope, source_ids, answer, created)
+        self.dirty = True
+    
+    def store(self, query_vector: List[float], scope, source_ids: frozenset, answer: str):
+        vec = self._unit(query_vector)
+        with self.lock:
+            self._insert(vec, scope, source_ids, answer, time.time())
+    
+    def clear(self) -> int:
+        with self.lock:
+            removed = len(self.entries)
+            self.entries.clear()
+            self.dirty = True
+            return removed
+    
+    def save(self, path: str, space: str) -> int:
+        """Write entries, least recently used first, to an .npz file; returns the count"""
+        with self.lock:
+            slots = list(self.entries)
+            vectors = self.vectors[slots] if slots else np.zeros((0, 0), dtype=np.float32)
+            meta = [
+                [scope, sorted(i.hex() for i in ids), answer, created]
+                for scope, ids, answer, created in (self.entries[slot] for slot in slots)
+            ]
+            self.dirty = False
+        # Write to a temp file unique to this save, then rename, so a crash
+        # mid-save never leaves a torn file and workers never share a temp file
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path),
+                                         suffix=".tmp", delete=False) as f:
+            tmp_path = f.name
+            try:
+                np.savez(f, vectors=vectors, meta=np.array(json.dumps({"space": space, "entries": meta})))
+            except BaseException:
+                f.close()
+                os.unlink(tmp_path)
+                raise
+        os.replace(tmp_path, path)
+        return len(slots)
+    
+    def load(self, path: str, space: str, max_age: float) -> int:
+        """Add saved entries younger than max_age seconds; returns the count"""
+        with np.load(path, allow_pickle=False) as data:
+            vectors = data["vectors"]
+            meta = json.loads(str(data["meta"]))
+        # Vectors from another embedding model are not comparable
+        if meta["space"] != space:
+            return 0
+        cutoff = time.time() - max_age
+        loaded = 0
+        with self.lock:
+            for vec, (scope, ids, answer, created) in zip(vectors, meta["entries"]):
+                if created >= cutoff:
+                    self._insert(vec, scope, frozenset(bytes.fromhex(i) for i in ids), answer, created)
+                    loaded += 1
+            self.dirty = False
+        return loaded
+
+answer_cache = SemanticCache(config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_THRESHOLD,
+                             config.ANSWER_CACHE_MIN_OVERLAP)
+
+def persist_answer_cache() -> bool:
+    """True when the answer cache is saved to disk across restarts"""
+    return config.ANSWER_CACHE_SIZE > 0 and bool(config.ANSWER_CACHE_PATH)
+
+def load_answer_cache():
+    """Reload answers saved by a previous run, skipping stale ones"""
+    if not persist_answer_cache() or not os.path.exists(config.ANSWER_CACHE_PATH):
+        return
+    try:
+        loaded = answer_cache.load(config.ANSWER_CACHE_PATH, embedding_space(), config.ANSWER_CACHE_TTL)
+        logger.info("✅ Reloaded %s cached answers", loaded)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not reload answer cache: {str(e)}")
+
+def save_answer_cache():
+    """Write the answer cache to disk if it changed since the last save"""
+    if not persist_answer_cache() or not answer_cache.dirty:
+        return
+    try:
+        saved = answer_cache.save(config.ANSWER_CACHE_PATH, embedding_space())
+        logger.info("Saved %s cached answers", saved)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not save answer cache: {str(e)}")
+
+async def save_answer_cache_periodically():
+    """Save the answer cache every few minutes, so a crash loses little"""
+    while True:
+        await asyncio.sleep(config.ANSWER_CACHE_SAVE_INTERVAL)
+        await asyncio.to_thread(save_answer_cache)
+
+def source_ids(doc_results: List[Dict]) -> frozenset:
+    """Identity of the retrieved chunks an answer was generated from"""
+    return frozenset(
+        hashlib.blake2b(f"{doc.get('source')}\0{doc['text']}".encode(), digest_size=8).digest()
+        for doc in doc_results
+    )
+
+# Well-known report files: (filename keywords, full title, short name)
+KNOWN_REPORTS = [
+    (('amadeus',), "Amadeus Report (Future Traveller Tribes 2030)", "Amadeus Report"),
+    (('accenture', 'travel-industrys'), "Accenture Report (Travel Industry's New Trip)", "Accenture Report"),
+    (('wef',), "WEF Report (Travel and Tourism at a Turning Point 2025)", "WEF Report"),
+]
+
+@lru_cache(maxsize=256)
+def source_display_names(src: str) -> tuple:
+    """(full title, short name) for a source file, memoized since sources repeat"""
+    src_lower = src.lower()
+    for keywords, title, short_name in KNOWN_REPORTS:
+        if any(keyword in src_lower for keyword in keywords):
+            return title, short_name
+    # Use filename without extension
+    name = src.replace('.pdf', '').replace('.docx', '').replace('.txt', '').replace('_', ' ').title()
+    return name, name
+
+def get_readable_name(src: str) -> str:
+    """Readable title for a source file"""
+    return source_display_names(src)[0]
+
+ANALYTICAL_KEYWORDS = ('similarity', 'similar', 'compare', 'difference', 'common', 'theme',
+                       'pattern', 'trend', 'analyze', 'analysis', 'relationship', 'connection')
+_ANALYTICAL_RE = _keyword_regex(ANALYTICAL_KEYWORDS)
+
+# Fixed prompt text, assembled once; the instruction blocks are
+# str.format templates filled in per query
+_PREAMBLE_ANALYTICAL = (
+    "You are an expert analyst. Your task is to ANALYZE, SYNTHESIZE, and COMPARE the content across multiple documents. "
+    "Do NOT just describe what's in each document. Instead:\n"
+    "1. Identify common themes, patterns, and insights across ALL documents\n"
+    "2. Compare and contrast different perspectives\n"
+    "3. Synthesize information into coherent findings\n"
+    "4. Provide structured, analytical responses with clear categories\n"
+    "5. Use your expertise to draw meaningful conclusions\n\n"
+)
+
+_PREAMBLE_GENERAL = (
+    "You are an expert AI assistant with deep knowledge across multiple domains. "
+    "Your goal is to provide COMPREHENSIVE, DETAILED, and INSIGHTFUL answers that go far beyond simple extraction.\n\n"
+    "INSTRUCTIONS FOR ANSWERING:\n"
+    "1. **Use Your Expertise**: Draw from your extensive knowledge to provide context, background, and broader understanding\n"
+    "2. **Enhance Document Content**: Don't just repeat what's in the documents - explain, elaborate, and add valuable insights\n"
+    "3. **Provide Context**: Explain WHY things matter, HOW they work, and WHAT the implications are\n"
+    "4. **Add Examples**: Include relevant examples, use cases, or scenarios to illustrate points\n"
+    "5. **Structure Clearly**: Use headings, bullet points, and organized sections for readability\n"
+    "6. **Be Comprehensive**: Cover multiple angles - definitions, benefits, challenges, trends, best practices\n"
+    "7. **Make it Actionable**: Include practical takeaways, recommendations, or next steps\n"
+    "8. **Connect Ideas**: Show relationships between concepts and broader industry trends\n\n"
+    "RESPONSE STYLE:\n"
+    "- Start with a clear overview or definition\n"
+    "- Provide detailed explanations with depth\n"
+    "- Use professional yet accessible language\n"
+    "- Include relevant statistics or data points when applicable\n"
+    "- End with key takeaways or actionable insights\n\n"
+)
+
+_INSTR_ANALYTICAL = (
+    "\nQUESTION: {query}\n\n"
+    "CRITICAL INSTRUCTIONS FOR YOUR ANALYSIS:\n"
+    "- You have {source_count} SEPARATE, DISTINCT source documents: {readable_sources}\n"
+    "- These are NOT the same document - they are {source_count} different documents\n"
+    "- DO NOT say 'the documents are identical' unless you verify the content is truly the same\n"
+    "- First, identify what is UNIQUE to each specific document\n"
+    "- Then, identify what is COMMON or similar across the different documents\n"
+    "- Compare and contrast perspectives from EACH named source\n"
+    "- Structure your response with clear themes/categories\n"
+    "- IMPORTANT: Use the ACTUAL DOCUMENT NAMES listed above\n"
+    "- NEVER use generic references like 'Document 1', 'Document 2', 'Document 3'\n"
+    "- For each theme, explicitly state which named sources discuss it\n"
+    "- If documents have different content, highlight the differences\n"
+    "- If documents have similar content, explain what is similar and what differs\n"
+    "- Use bullet points, tables, or structured format for clarity\n"
+    "- Be analytical and insightful, not just descriptive\n\n"
+    "ANSWER:"
+)
+
+_INSTR_GENERAL = (
+    "\nQUESTION: {query}\n\n"
+    "CRITICAL INSTRUCTIONS FOR YOUR RESPONSE:\n"
+    "- **Go Beyond the Documents**: Don't just extract or summarize - add context, explanations, and insights\n"
+    "- **Provide Depth**: Explain concepts thoroughly with background information and implications\n"
+    "- **Add Value**: Include industry context, trends, best practices, and real-world applications\n"
+    "- **Structure Professionally**: Use clear headings (##, ###), bullet points, and logical flow\n"
+    "- **Be Comprehensive**: Cover definition, importance, benefits, challenges, examples, and recommendations\n"
+    "- **Make it Actionable**: Include practical takeaways and next steps\n"
+    "- **Use Examples**: Illustrate points with relevant scenarios or use cases\n"
+    "- **Connect to Broader Context**: Show how this relates to industry trends and future directions\n\n"
+    "Remember: You're an expert consultant, not just a document reader. Provide the kind of detailed, "
+    "insightful response that would come from a subject matter expert.\n\n"
+    "ANSWER:"
+)
+
+def build_answer_prompt(query: str, doc_results: List[Dict], web_results: Optional[List[Dict]] = None) -> str:
+    """Assemble the LLM prompt from retrieved documents and web results"""
     
     # Detect if query is analytical (comparison, similarity, analysis)
-    analytical_keywords = ['similarity', 'similar', 'compare', 'difference', 'common', 'theme', 
-                          'pattern', 'trend', 'analyze', 'analysis', 'relationship', 'connection']
-    is_analytical = any(keyword in query.lower() for keyword in analytical_keywords)
+    is_analytical = _ANALYTICAL_RE.search(query.lower()) is not None
     
     # Check if we have documents
     has_documents = doc_results and len(doc_results) > 0
@@ -566,15 +1299,7 @@ async def generate_answer(query: str, doc_results: List[Dict], web_results: Opti
     # Build context based on query type
     if is_analytical and has_documents:
         # For analytical queries: emphasize synthesis and comparison
-        context_parts = [
-            "You are an expert analyst. Your task is to ANALYZE, SYNTHESIZE, and COMPARE the content across multiple documents. "
-            "Do NOT just describe what's in each document. Instead:\n"
-            "1. Identify common themes, patterns, and insights across ALL documents\n"
-            "2. Compare and contrast different perspectives\n"
-            "3. Synthesize information into coherent findings\n"
-            "4. Provide structured, analytical responses with clear categories\n"
-            "5. Use your expertise to draw meaningful conclusions\n\n"
-        ]
+        context_parts = [_PREAMBLE_ANALYTICAL]
         
                     # Add full document content for analysis with clear source labels
         # First, list all unique sources and group chunks by source
@@ -588,77 +1313,48 @@ async def generate_answer(query: str, doc_results: List[Dict], web_results: Opti
                 chunks_by_source[source] = []
             chunks_by_source[source].append(doc['text'])
         
-        # Create readable names for sources
-        def get_readable_name(src):
-            if 'amadeus' in src.lower():
-                return "Amadeus Report (Future Traveller Tribes 2030)"
-            elif 'accenture' in src.lower() or 'travel-industrys' in src.lower():
-                return "Accenture Report (Travel Industry's New Trip)"
-            elif 'wef' in src.lower():
-                return "WEF Report (Travel and Tourism at a Turning Point 2025)"
-            else:
-                # Use filename without extension
-                return src.replace('.pdf', '').replace('.docx', '').replace('.txt', '').replace('_', ' ').title()
-        
-        context_parts.append("=" * 80 + "\n")
-        context_parts.append(f"YOU HAVE {len(unique_sources)} DIFFERENT SOURCE DOCUMENTS TO ANALYZE:\n")
-        context_parts.append(f"\nIMPORTANT: These are {len(unique_sources)} SEPARATE, DISTINCT documents (not the same document repeated):\n\n")
-        for idx, src in enumerate(unique_sources, 1):
-            readable = get_readable_name(src)
-            chunk_count = len(chunks_by_source[src])
-            context_parts.append(f"{idx}. **{readable}** ({chunk_count} chunk(s) from this document)\n")
-        context_parts.append("\n" + "=" * 80 + "\n\n")
-        context_parts.append("CRITICAL INSTRUCTIONS:\n")
-        context_parts.append("- These are DIFFERENT documents with DIFFERENT content\n")
-        context_parts.append("- DO NOT say they are 'identical' or 'the same' unless the content is truly identical\n")
-        context_parts.append("- Analyze what is UNIQUE to each document and what is COMMON across them\n")
-        context_parts.append("- Use the actual document names listed above, NOT 'Document 1, Document 2, Document 3'\n\n")
-        context_parts.append("DOCUMENT CONTENT (grouped by source):\n\n")
+        rule = "=" * 80
+        source_list = "".join(
+            f"{idx}. **{get_readable_name(src)}** ({len(chunks_by_source[src])} chunk(s) from this document)\n"
+            for idx, src in enumerate(unique_sources, 1)
+        )
+        context_parts.append(
+            f"{rule}\n"
+            f"YOU HAVE {len(unique_sources)} DIFFERENT SOURCE DOCUMENTS TO ANALYZE:\n"
+            f"\nIMPORTANT: These are {len(unique_sources)} SEPARATE, DISTINCT documents (not the same document repeated):\n\n"
+            f"{source_list}"
+            f"\n{rule}\n\n"
+            "CRITICAL INSTRUCTIONS:\n"
+            "- These are DIFFERENT documents with DIFFERENT content\n"
+            "- DO NOT say they are 'identical' or 'the same' unless the content is truly identical\n"
+            "- Analyze what is UNIQUE to each document and what is COMMON across them\n"
+            "- Use the actual document names listed above, NOT 'Document 1, Document 2, Document 3'\n\n"
+            "DOCUMENT CONTENT (grouped by source):\n\n"
+        )
         
-        # Present content grouped by source document
+        # Present content grouped by source document, one block per source
         for idx, src in enumerate(unique_sources, 1):
             readable_name = get_readable_name(src)
-            context_parts.append(f"\n{'='*80}\n")
-            context_parts.append(f"SOURCE DOCUMENT {idx}: {readable_name}\n")
-            context_parts.append(f"{'='*80}\n\n")
-            
-            # Combine all chunks from this source
-            for chunk_idx, chunk_text in enumerate(chunks_by_source[src], 1):
-                context_parts.append(f"[Excerpt {chunk_idx} from {readable_name}]:\n")
-                context_parts.append(f"{chunk_text}\n\n")
-            
-            context_parts.append(f"\n{'='*80}\n\n")
+            excerpts = "".join(
+                f"[Excerpt {chunk_idx} from {readable_name}]:\n{chunk_text}\n\n"
+                for chunk_idx, chunk_text in enumerate(chunks_by_source[src], 1)
+            )
+            context_parts.append(
+                f"\n{rule}\nSOURCE DOCUMENT {idx}: {readable_name}\n{rule}\n\n"
+                f"{excerpts}"
+                f"\n{rule}\n\n"
+            )
     else:
         # For general queries: enhanced detailed approach
-        context_parts = [
-            "You are an expert AI assistant with deep knowledge across multiple domains. "
-            "Your goal is to provide COMPREHENSIVE, DETAILED, and INSIGHTFUL answers that go far beyond simple extraction.\n\n"
-            "INSTRUCTIONS FOR ANSWERING:\n"
-            "1. **Use Your Expertise**: Draw from your extensive knowledge to provide context, background, and broader understanding\n"
-            "2. **Enhance Document Content**: Don't just repeat what's in the documents - explain, elaborate, and add valuable insights\n"
-            "3. **Provide Context**: Explain WHY things matter, HOW they work, and WHAT the implications are\n"
-            "4. **Add Examples**: Include relevant examples, use cases, or scenarios to illustrate points\n"
-            "5. **Structure Clearly**: Use headings, bullet points, and organized sections for readability\n"
-            "6. **Be Comprehensive**: Cover multiple angles - definitions, benefits, challenges, trends, best practices\n"
-            "7. **Make it Actionable**: Include practical takeaways, recommendations, or next steps\n"
-            "8. **Connect Ideas**: Show relationships between concepts and broader industry trends\n\n"
-            "RESPONSE STYLE:\n"
-            "- Start with a clear overview or definition\n"
-            "- Provide detailed explanations with depth\n"
-            "- Use professional yet accessible language\n"
-            "- Include relevant statistics or data points when applicable\n"
-            "- End with key takeaways or actionable insights\n\n"
-        ]
+        context_parts = [_PREAMBLE_GENERAL]
         
         # Add documents as reference with full content
         if has_documents:
             context_parts.append("REFERENCE DOCUMENTS (Use these as foundation, but enhance with your knowledge):\n\n")
-            for i, doc in enumerate(doc_results, 1):
-                source_name = doc.get('source', 'Unknown')
-                # Provide more context from documents
-                context_parts.append(f"Document {i} (Source: {source_name}):\n")
-                context_parts.append(f"{doc['text']}\n\n")
-                context_parts.append(f"{'='*80}\n\n")
+            context_parts.extend(
+                f"Document {i} (Source: {doc.get('source', 'Unknown')}):\n{doc['text']}\n\n{'='*80}\n\n"
+                for i, doc in enumerate(doc_results, 1)
+            )
         else:
             # No documents - pure general knowledge query
             context_parts.append(
@@ -669,63 +1365,24 @@ async def generate_answer(query: str, doc_results: List[Dict], web_results: Opti
     # Add web results if available
     if web_results:
         context_parts.append("\nADDITIONAL WEB INFORMATION:\n")
-        for i, result in enumerate(web_results, 1):
-            context_parts.append(f"[W{i}] {result['title']}: {result['snippet']}\n\n")
+        context_parts.extend(
+            f"[W{i}] {result['title']}: {result['snippet']}\n\n"
+            for i, result in enumerate(web_results, 1)
+        )
     
     # Add query-specific instructions
     if is_analytical:
         # Get unique source names for explicit instruction
         unique_sources = list(set(doc.get('source', 'Unknown') for doc in doc_results))
         
-        # Create a mapping of document names for clarity
-        source_names = {}
-        for src in unique_sources:
-            if 'amadeus' in src.lower():
-                source_names[src] = "Amadeus Report"
-            elif 'accenture' in src.lower() or 'travel-industrys' in src.lower():
-                source_names[src] = "Accenture Report"
-            elif 'wef' in src.lower():
-                source_names[src] = "WEF Report"
-            else:
-                source_names[src] = src.replace('.pdf', '').replace('.docx', '').replace('.txt', '').replace('_', ' ').title()
-        
-        readable_sources = ", ".join([f"'{source_names.get(s, s)}'" for s in unique_sources])
+        # Short names for the known reports, for the instruction list
+        readable_sources = ", ".join([f"'{source_display_names(s)[1]}'" for s in unique_sources])
         
-        context_parts.append(
-            f"\nQUESTION: {query}\n\n"
-            "CRITICAL INSTRUCTIONS FOR YOUR ANALYSIS:\n"
-            f"- You have {len(unique_sources)} SEPARATE, DISTINCT source documents: {readable_sources}\n"
-            f"- These are NOT the same document - they are {len(unique_sources)} different documents\n"
-            "- DO NOT say 'the documents are identical' unless you verify the content is truly the same\n"
-            "- First, identify what is UNIQUE to each specific document\n"
-            "- Then, identify what is COMMON or similar across the different documents\n"
-            "- Compare and contrast perspectives from EACH named source\n"
-            "- Structure your response with clear themes/categories\n"
-            "- IMPORTANT: Use the ACTUAL DOCUMENT NAMES listed above\n"
-            "- NEVER use generic references like 'Document 1', 'Document 2', 'Document 3'\n"
-            "- For each theme, explicitly state which named sources discuss it\n"
-            "- If documents have different content, highlight the differences\n"
-            "- If documents have similar content, explain what is similar and what differs\n"
-            "- Use bullet points, tables, or structured format for clarity\n"
-            "- Be analytical and insightful, not just descriptive\n\n"
-            "ANSWER:"
-        )
+        context_parts.append(_INSTR_ANALYTICAL.format(
+            query=query, source_count=len(unique_sources), readable_sources=readable_sources
+        ))
     else:
-        context_parts.append(
-            f"\nQUESTION: {query}\n\n"
-            "CRITICAL INSTRUCTIONS FOR YOUR RESPONSE:\n"
-            "- **Go Beyond the Documents**: Don't just extract or summarize - add context, explanations, and insights\n"
-            "- **Provide Depth**: Explain concepts thoroughly with background information and implications\n"
-            "- **Add Value**: Include industry context, trends, best practices, and real-world applications\n"
-            "- **Structure Professionally**: Use clear headings (##, ###), bullet points, and logical flow\n"
-            "- **Be Comprehensive**: Cover definition, importance, benefits, challenges, examples, and recommendations\n"
-            "- **Make it Actionable**: Include practical takeaways and next steps\n"
-            "- **Use Examples**: Illustrate points with relevant scenarios or use cases\n"
-            "- **Connect to Broader Context**: Show how this relates to industry trends and future directions\n\n"
-            "Remember: You're an expert consultant, not just a document reader. Provide the kind of detailed, "
-            "insightful response that would come from a subject matter expert.\n\n"
-            "ANSWER:"
-        )
+        context_parts.append(_INSTR_GENERAL.format(query=query))
     
     prompt = "".join(context_parts)
     
@@ -736,91 +1393,177 @@ async def generate_answer(query: str, doc_results: List[Dict], web_results: Opti
         logger.warning(f"Prompt too long ({len(prompt)} chars), truncating to {max_chars}")
         prompt = prompt[:max_chars] + "\n\n[Content truncated due to length]\n\nANSWER:"
     
+    return prompt
+
+# Fixed part of each provider's chat completion request; only the
+# messages change per call
+PROVIDER_CONFIGS = {
+    "together": {
+        "label": "Together AI",  # Best for detailed analysis
+        "api_key": config.TOGETHER_API_KEY,
+        "context_tokens": 131072,
+        "url": "https://api.together.xyz/v1/chat/completions",
+        "headers": {
+            "Authorization": f"Bearer {config.TOGETHER_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        "body_base": {
+            "model": config.LLM_MODEL,
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "top_k": 50
+        }
+    },
+    "groq": {
+        "label": "Groq",  # Best for fast, current information
+        "api_key": config.GROQ_API_KEY,
+        "context_tokens": 131072,
+        "url": "https://api.groq.com/openai/v1/chat/completions",
+        "headers": {
+            "Authorization": f"Bearer {config.GROQ_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        "body_base": {
+            "model": "llama-3.3-70b-versatile",
+            "temperature": 0.7
+        }
+    }
+}
+
+def get_tokenizer():
+    """Lazy load the cl100k_base encoding (None without tiktoken or offline)"""
+    global tokenizer
+    if tokenizer is None and TIKTOKEN_AVAILABLE:
+        try:
+            tokenizer = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:  # The encoding file is downloaded on first use
+            logger.warning(f"⚠️ Tokenizer unavailable, estimating prompt tokens: {str(e)}")
+            tokenizer = False
+    return tokenizer or None
+
+def count_tokens(text: str) -> int:
+    """
+    Approximate token count of a prompt
+    cl100k_base is not the Llama tokenizer but lands close on English text;
+    without it, fall back to ~4 characters per token
+    """
+    enc = get_tokenizer()
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+# Providers with an API key configured, resolved once at startup; the
+# first one is the fallback for requests naming an unavailable provider
+LLM_PROVIDERS = {name: cfg for name, cfg in PROVIDER_CONFIGS.items() if cfg["api_key"]}
+
+def llm_request(llm_provider: str, prompt: str) -> tuple:
+    """(url, headers, json body) for a chat completion with the requested provider"""
+    cfg = LLM_PROVIDERS.get(llm_provider)
+    if cfg is not None:
+        logger.info("Using %s (%s)", cfg["label"], cfg["body_base"]["model"])
+    elif LLM_PROVIDERS:
+        cfg = next(iter(LLM_PROVIDERS.values()))
+        logger.warning(f"Requested provider '{llm_provider}' not available, falling back to {cfg['label']}")
+    else:
+        raise HTTPException(status_code=500, detail="No LLM API keys configured")
+    
+    # Fit the completion into what the context window leaves after the
+    # prompt, rather than letting the provider reject the request
+    budget = cfg["context_tokens"] - count_tokens(prompt) - config.PROMPT_TOKEN_MARGIN
+    if budget < 1:
+        raise HTTPException(status_code=400, detail="Prompt too long for the model context window")
+    if budget < config.MAX_TOKENS:
+        logger.warning("Long prompt: completion limited to %s tokens", budget)
+    
+    body = {
+        **cfg["body_base"],
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": min(config.MAX_TOKENS, budget)
+    }
+    return cfg["url"], cfg["headers"], body
+
+def llm_payload(headers: Dict, body: Dict) -> tuple:
+    """(headers, encoded body) for an LLM request, gzipped when large enough"""
+    content = json_dumps(body)
+    if 0 < config.LLM_GZIP_MIN_BYTES <= len(content):
+        # Level 1: the win is fewer bytes on the wire, not the best ratio
+        return {**headers, "Content-Encoding": "gzip"}, gzip.compress(content, compresslevel=1)
+    return headers, content
+
+async def generate_answer(query: str, doc_results: List[Dict], web_results: Optional[List[Dict]] = None, llm_provider: str = "together") -> str:
+    """Generate analytical, synthesized answer using Together AI or Groq"""
+    # Reuse the answer to a near-identical question over the same sources;
+    # answers that include live web results are always regenerated
+    cacheable = config.ANSWER_CACHE_SIZE > 0 and not web_results
+    if cacheable:
+        query_vector = embed_query(query)
+        doc_ids = source_ids(doc_results)
+        cached = answer_cache.lookup(query_vector, llm_provider, doc_ids)
+        if cached is not None:
+            logger.info("Answer cache hit for query: %s", query[:50])
+            return cached
+    
+    prompt = build_answer_prompt(query, doc_results, web_results)
+    
     # Call Together AI or Groq API based on llm_provider parameter
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            if llm_provider == "together" and config.TOGETHER_API_KEY:
-                # Together AI API - Best for detailed analysis
-                logger.info(f"Using Together AI ({config.LLM_MODEL}) for detailed response")
-                response = await client.post(
-                    "https://api.together.xyz/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {config.TOGETHER_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": config.LLM_MODEL,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.7,
-                        "max_tokens": config.MAX_TOKENS,
-                        "top_p": 0.9,
-                        "top_k": 50
-                    }
-                )
-            elif llm_provider == "groq" and config.GROQ_API_KEY:
-                # Groq API - Best for fast, current information
-                logger.info("Using Groq (llama-3.3-70b-versatile) for fast response")
-                response = await client.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {config.GROQ_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "llama-3.3-70b-versatile",
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.7,
-                        "max_tokens": config.MAX_TOKENS
-                    }
-                )
-            else:
-                # Fallback: Try Together AI first, then Groq
-                if config.TOGETHER_API_KEY:
-                    logger.warning(f"Requested provider '{llm_provider}' not available, falling back to Together AI")
-                    response = await client.post(
-                        "https://api.together.xyz/v1/chat/completions",
-                        headers={
-                            "Authorization": f"Bearer {config.TOGETHER_API_KEY}",
-                            "Content-Type": "application/json"
-                        },
-                        json={
-                            "model": config.LLM_MODEL,
-                            "messages": [{"role": "user", "content": prompt}],
-                            "temperature": 0.7,
-                            "max_tokens": config.MAX_TOKENS,
-                            "top_p": 0.9,
-                            "top_k": 50
-                        }
-                    )
-                elif config.GROQ_API_KEY:
-                    logger.warning(f"Requested provider '{llm_provider}' not available, falling back to Groq")
-                    response = await client.post(
-                        "https://api.groq.com/openai/v1/chat/completions",
-                        headers={
-                            "Authorization": f"Bearer {config.GROQ_API_KEY}",
-                            "Content-Type": "application/json"
-                        },
-                        json={
-                            "model": "llama-3.3-70b-versatile",
-                            "messages": [{"role": "user", "content": prompt}],
-                            "temperature": 0.7,
-                            "max_tokens": config.MAX_TOKENS
-                        }
-                    )
-                else:
-                    raise HTTPException(status_code=500, detail="No LLM API keys configured")
-            
-            if response.status_code != 200:
-                error_detail = response.text
-                logger.error(f"LLM API error: {error_detail}")
-                raise HTTPException(status_code=500, detail=f"LLM generation failed: {error_detail}")
-            
-            return response.json()["choices"][0]["message"]["content"]
-    
+        url, headers, body = llm_request(llm_provider, prompt)
+        headers, content = llm_payload(headers, body)
+        response = await get_http_client().post(url, headers=headers, content=content, timeout=60.0)
+        
+        if response.status_code != 200:
+            error_detail = response.text
+            logger.error(f"LLM API error: {error_detail}")
+            raise HTTPException(status_code=500, detail=f"LLM generation failed: {error_detail}")
+        
+        answer = json_loads(response.content)["choices"][0]["message"]["content"]
+        if cacheable:
+            answer_cache.store(query_vector, llm_provider, doc_ids, answer)
+        return answer
+
     except Exception as e:
         logger.error(f"LLM generation failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Generation error: {str(e)}")
 
+async def stream_answer(query: str, doc_results: List[Dict], web_results: Optional[List[Dict]] = None, llm_provider: str = "together"):
+    """Like generate_answer, but yields the answer text as the LLM produces it"""
+    cacheable = config.ANSWER_CACHE_SIZE > 0 and not web_results
+    if cacheable:
+        query_vector = embed_query(query)
+        doc_ids = source_ids(doc_results)
+        cached = answer_cache.lookup(query_vector, llm_provider, doc_ids)
+        if cached is not None:
+            logger.info("Answer cache hit for query: %s", query[:50])
+            yield cached
+            return
+    
+    prompt = build_answer_prompt(query, doc_results, web_results)
+    url, headers, body = llm_request(llm_provider, prompt)
+    
+    parts = []
+    headers, content = llm_payload(headers, {**body, "stream": True})
+    async with get_http_client().stream("POST", url, headers=headers, content=content, timeout=60.0) as response:
+        if response.status_code != 200:
+            error_detail = (await response.aread()).decode(errors="replace")
+            logger.error(f"LLM API error: {error_detail}")
+            raise HTTPException(status_code=500, detail=f"LLM generation failed: {error_detail}")
+        
+        # OpenAI-style server-sent events: "data: {json}" lines, then "data: [DONE]"
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            choices = json_loads(data).get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                parts.append(delta)
+                yield delta
+    
+    if cacheable:
+        answer_cache.store(query_vector, llm_provider, doc_ids, "".join(parts))
+
 # ==================== API ENDPOINTS ====================
 
 @app.post("/upload", response_model=IngestionResponse)
@@ -853,15 +1596,49 @@ async def upload_document(
         content = await file.read()
         
         # Process document with user_id
-        result = ingest_document(content, file.filename, domain, user_id)
+        result = await asyncio.to_thread(ingest_document, content, file.filename, domain, user_id)
         
-        logger.info(f"Successfully ingested {file.filename} for user {user_id}")
+        logger.info("Successfully ingested %s for user %s", file.filename, user_id)
         return IngestionResponse(**result)
     
     except Exception as e:
         logger.error(f"Upload failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+NO_CONTEXT_ANSWER = "No relevant information found. Please upload documents or enable web search."
+
+def skip_generation(doc_results: List[Dict], web_results: Optional[List[Dict]]) -> bool:
+    """True when there is no context to answer from and general-knowledge answers are off"""
+    return not config.ANSWER_WITHOUT_CONTEXT and not doc_results and not web_results
+
+async def gather_query_context(request: QueryRequest) -> tuple:
+    """Detect domain and intent, then retrieve documents and web results for a query"""
+    # 1. Auto-detect domain if not specified
+    detected_domain = request.domain
+    if request.detect_domain and not request.domain:
+        detected_domain = detect_domain(request.query)
+        logger.info("Auto-detected domain: %s", detected_domain)
+    
+    # 2. Detect intent if requested
+    detected_intent = None
+    if request.detect_intent:
+        detected_intent = detect_intent(request.query)
+        logger.info("Detected intent: %s", detected_intent)
+    
+    # 3. Retrieve relevant documents (with optional user_id filter and reports)
+    logger.info("Processing query: %s... (domain: %s, user_id: %s, include_reports: %s)", request.query[:50], detected_domain, request.user_id, request.include_reports)
+    doc_results = await asyncio.to_thread(
+        retrieve_documents, request.query, detected_domain, request.top_k, request.user_id, request.include_reports
+    )
+    
+    # 3. Web search if needed (enhanced with document context)
+    web_results = None
+    if request.include_web or needs_web_search(request.query):
+        logger.info("Triggering context-enhanced web search...")
+        web_results = await search_web(request.query, doc_results)
+    
+    return detected_domain, detected_intent, doc_results, web_results
+
 @app.post("/query", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
     """
@@ -874,30 +1651,14 @@ async def query_documents(request: QueryRequest):
     start_time = datetime.now()
     
     try:
-        # 1. Auto-detect domain if not specified
-        detected_domain = request.domain
-        if request.detect_domain and not request.domain:
-            detected_domain = detect_domain(request.query)
-            logger.info(f"Auto-detected domain: {detected_domain}")
-        
-        # 2. Detect intent if requested
-        detected_intent = None
-        if request.detect_intent:
-            detected_intent = detect_intent(request.query)
-            logger.info(f"Detected intent: {detected_intent}")
-        
-        # 3. Retrieve relevant documents (with optional user_id filter and reports)
-        logger.info(f"Processing query: {request.query[:50]}... (domain: {detected_domain}, user_id: {request.user_id}, include_reports: {request.include_reports})")
-        doc_results = retrieve_documents(request.query, detected_domain, request.top_k, request.user_id, request.include_reports)
+        detected_domain, detected_intent, doc_results, web_results = await gather_query_context(request)
         
-        # 3. Web search if needed (enhanced with document context)
-        web_results = None
-        if request.include_web or needs_web_search(request.query):
-            logger.info("Triggering context-enhanced web search...")
-            web_results = await search_web(request.query, doc_results)
-        
-        # 4. Generate answer with selected LLM provider
-        answer = await generate_answer(request.query, doc_results, web_results, request.llm_provider)
+        # 4. Generate answer with selected LLM provider, unless there is
+        # nothing to ground it on
+        if skip_generation(doc_results, web_results):
+            answer = NO_CONTEXT_ANSWER
+        else:
+            answer = await generate_answer(request.query, doc_results, web_results, request.llm_provider)
         
         processing_time = (datetime.now() - start_time).total_seconds()
         
@@ -915,6 +1676,45 @@ async def query_documents(request: QueryRequest):
         logger.error(f"Query failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """
+    Query the RAG system, streaming the answer as server-sent events
+    
+    - "sources" event: domain, intent, sources and web results
+    - data events: {"delta": "..."} answer text as it is generated
+    - "done" event: processing time (or an "error" event on failure)
+    """
+    start_time = datetime.now()
+    
+    try:
+        detected_domain, detected_intent, doc_results, web_results = await gather_query_context(request)
+    except Exception as e:
+        logger.error(f"Query failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def events():
+        yield "event: sources\ndata: " + json.dumps({
+            "intent": detected_intent,
+            "domain": detected_domain,
+            "sources": doc_results,
+            "web_results": web_results
+        }) + "\n\n"
+        try:
+            if skip_generation(doc_results, web_results):
+                yield "data: " + json.dumps({"delta": NO_CONTEXT_ANSWER}) + "\n\n"
+            else:
+                async for delta in stream_answer(request.query, doc_results, web_results, request.llm_provider):
+                    yield "data: " + json.dumps({"delta": delta}) + "\n\n"
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {str(e)}")
+            yield "event: error\ndata: " + json.dumps({"error": str(e)}) + "\n\n"
+            return
+        processing_time = (datetime.now() - start_time).total_seconds()
+        yield "event: done\ndata: " + json.dumps({"processing_time": processing_time}) + "\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @app.post("/batch-upload")
 async def batch_upload(
     files: List[UploadFile] = File(...),
@@ -925,15 +1725,42 @@ async def batch_upload(
     results = []
     total_chunks = 0
     
-    for file in files:
-        try:
+    # Ingest files concurrently in worker threads, a few at a time to bound
+    # memory; extraction, embedding and upserts overlap across files, and
+    # all files share upsert batches
+    semaphore = asyncio.Semaphore(config.INGEST_CONCURRENCY)
+    
+    async def ingest(file: UploadFile):
+        async with semaphore:
             content = await file.read()
-            result = ingest_document(content, file.filename, domain, user_id)
-            results.append({"file": file.filename, "status": "success", **result})
-            total_chunks += result.get("chunks_created", 0)
+            return await asyncio.to_thread(ingest_document, content, file.filename, domain, user_id, uploader)
+    
+    try:
+        uploader = VectorUploader(await asyncio.to_thread(get_pinecone_index), config.PINECONE_UPSERT_BATCH)
+    except Exception as e:
+        outcomes = [e] * len(files)
+    else:
+        outcomes = await asyncio.gather(*(ingest(file) for file in files), return_exceptions=True)
+        try:
+            # Upsert the last partial batch and wait for all of them; a
+            # failure can't be pinned on one file, so every extracted file
+            # is reported failed
+            await asyncio.to_thread(uploader.flush)
         except Exception as e:
-            logger.error(f"Failed to upload {file.filename}: {str(e)}")
-            results.append({"file": file.filename, "status": "failed", "error": str(e)})
+            outcomes = [outcome if isinstance(outcome, Exception) else e for outcome in outcomes]
+    
+    if user_id:
+        for file, outcome in zip(files, outcomes):
+            if not isinstance(outcome, Exception):
+                await asyncio.to_thread(record_user_document, user_id, file.filename, outcome["chunks_created"])
+    
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Failed to upload {file.filename}: {str(outcome)}")
+            results.append({"file": file.filename, "status": "failed", "error": str(outcome)})
+        else:
+            results.append({"file": file.filename, "status": "success", **outcome})
+            total_chunks += outcome.get("chunks_created", 0)
     
     return {
         "total": len(files),
@@ -958,6 +1785,18 @@ async def get_statistics():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/cache/clear")
+async def clear_caches():
+    """Clear the in-memory query embedding and answer caches"""
+    embeddings_cleared = _embed_query.cache_info().currsize
+    _embed_query.cache_clear()
+    answers_cleared = answer_cache.clear()
+    return {
+        "status": "cleared",
+        "query_embeddings_cleared": embeddings_cleared,
+        "answers_cleared": answers_cleared
+    }
+
 @app.get("/domains")
 async def list_domains():
     """List available domains"""
@@ -970,10 +1809,13 @@ async def list_domains():
 async def get_user_documents(user_id: str):
     """Get list of documents uploaded by a specific user"""
     try:
-        # Query Pinecone to get unique documents for this user
-        # This is a simplified approach - in production, use a separate metadata store
-        model = get_embedder()  # Lazy load embedder
-        query_embedding = model.encode("document").tolist()
+        if await asyncio.to_thread(user_documents_backfilled, user_id):
+            documents = await asyncio.to_thread(list_user_documents, user_id)
+            return {"user_id": user_id, "documents": documents}
+        
+        # The store is disabled or the user's uploads may predate it, so
+        # scan their vectors in Pinecone (once, when the store is enabled)
+        query_embedding = embed_query("document")
         
         idx = get_pinecone_index()  # Lazy load Pinecone index
         results = idx.query(
@@ -983,23 +1825,24 @@ async def get_user_documents(user_id: str):
             filter={"user_id": user_id, "type": "document"}
         )
         
-        # Extract unique documents
-        documents = {}
-        for match in results.get("matches", []):
-            metadata = match.get("metadata", {})
-            source = metadata.get("source", "Unknown")
-            if source not in documents:
-                documents[source] = {
-                    "filename": source,
-                    "chunks": 0,
-                    "timestamp": metadata.get("timestamp", "N/A")
-                }
-            documents[source]["chunks"] += 1
+        # Extract unique documents: chunk counts per source, and the timestamp
+        # of each source's first match
+        metadatas = [match.get("metadata", {}) for match in results.get("matches", [])]
+        sources = [metadata.get("source", "Unknown") for metadata in metadatas]
+        chunk_counts = Counter(sources)
+        timestamps = {}
+        for source, metadata in zip(sources, metadatas):
+            if source not in timestamps:
+                timestamps[source] = metadata.get("timestamp", "N/A")
         
-        return {
-            "user_id": user_id,
-            "documents": list(documents.values())
-        }
+        documents = [
+            {"filename": source, "chunks": chunks, "timestamp": timestamps[source]}
+            for source, chunks in chunk_counts.items()
+        ]
+        if get_doc_store() is not None:
+            documents = await asyncio.to_thread(backfill_user_documents, user_id, documents)
+        
+        return {"user_id": user_id, "documents": documents}
     except Exception as e:
         logger.error(f"Failed to get user documents: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1024,37 +1867,53 @@ async def query_with_dual_answers(request: QueryRequest):
         if request.detect_intent:
             detected_intent = detect_intent(request.query)
         
-        # Retrieve user documents (if user_id provided)
-        user_doc_results = []
-        if request.user_id:
-            user_doc_results = retrieve_documents(
-                request.query, detected_domain, request.top_k, 
-                user_id=request.user_id, include_reports=False
+        # Embed the query once for both retrievals
+        query_embedding = await asyncio.to_thread(embed_query, request.query)
+        
+        # Retrieve user documents (if user_id provided) and general knowledge
+        # (no user filter) concurrently; the Pinecone client is blocking
+        async def retrieve_user_documents():
+            if not request.user_id:
+                return []
+            return await asyncio.to_thread(
+                retrieve_documents, request.query, detected_domain, request.top_k,
+                user_id=request.user_id, include_reports=False, query_embedding=query_embedding
             )
-            logger.info(f"Found {len(user_doc_results)} chunks from user documents")
         
-        # Retrieve general knowledge (no user filter)
-        general_doc_results = retrieve_documents(
-            request.query, detected_domain, request.top_k, 
-            user_id=None, include_reports=request.include_reports
+        user_doc_results, general_doc_results = await asyncio.gather(
+            retrieve_user_documents(),
+            asyncio.to_thread(
+                retrieve_documents, request.query, detected_domain, request.top_k,
+                user_id=None, include_reports=request.include_reports, query_embedding=query_embedding
+            )
         )
-        logger.info(f"Found {len(general_doc_results)} chunks from general knowledge")
+        if request.user_id:
+            logger.info("Found %s chunks from user documents", len(user_doc_results))
+        logger.info("Found %s chunks from general knowledge", len(general_doc_results))
         
         # Web search if needed
         web_results = None
         if request.include_web or needs_web_search(request.query):
             web_results = await search_web(request.query, general_doc_results)
         
-        # Generate document-specific answer
-        doc_answer = "No relevant information found in your uploaded documents."
-        if user_doc_results:
-            doc_answer = await generate_answer(
+        # Generate the document-specific and generalized answers concurrently
+        async def generate_document_answer():
+            if not user_doc_results:
+                return "No relevant information found in your uploaded documents."
+            return await generate_answer(
                 request.query, user_doc_results, None, request.llm_provider
             )
         
-        # Generate generalized answer
-        general_answer = await generate_answer(
-            request.query, general_doc_results, web_results, request.llm_provider
+        async def generate_general_answer():
+            if skip_generation(general_doc_results, web_results):
+                return NO_CONTEXT_ANSWER
+            return await generate_answer(
+                request.query, general_doc_results, web_results, request.llm_provider
+            )
+        
+        doc_answer, general_answer = await asyncio.gather(
+            generate_document_answer(),
+            generate_general_answer()
         )
         
         processing_time = (datetime.now() - start_time).total_seconds()
@@ -1093,7 +1952,9 @@ async def root():
             "upload": "POST /upload - Upload single document",
             "batch_upload": "POST /batch-upload - Upload multiple documents",
             "query": "POST /query - Query with RAG + web search",
+            "query_stream": "POST /query/stream - Same as /query, answer streamed as server-sent events",
             "stats": "GET /stats - Database statistics",
+            "cache_clear": "POST /cache/clear - Clear query and answer caches",
             "domains": "GET /domains - List available domains"
         }
     })
@@ -1128,6 +1989,24 @@ if __name__ == "__main__":
     print(f" Host: 0.0.0.0")
     print(f" Environment: {'Render' if os.environ.get('RENDER') else 'Local'}")
     
+    # uvloop and httptools (uvicorn[standard]) where available; uvloop has
+    # no Windows build, so fall back to the asyncio loop there
+    try:
+        import uvloop
+        loop = "uvloop"
+    except ImportError:
+        loop = "asyncio"
+    try:
+        import httptools
+        http = "httptools"
+    except ImportError:
+        http = "h11"
+    
+    # Each worker loads its own embedding model, so scale out only when the
+    # instance has the memory for it (one worker on Render free tier)
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    print(f" Event loop: {loop}, HTTP parser: {http}, workers: {workers}")
+    
     # Remove the lifespan from app and use a simple one
     app.router.lifespan_context = None
     
@@ -1137,5 +2016,8 @@ if __name__ == "__main__":
         port=port,
         log_level="info",
         access_log=True,
-        factory=False
+        factory=False,
+        loop=loop,
+        http=http,
+        workers=workers
     )
\ No newline at end of file
@@ -5,61 +5,206 @@ Collects 2000-4000 documents from free sources
 """
 
 import os
+import io
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
+try:
+    # Optional: multithreaded C++ CSV parser, much faster than pandas
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+try:
+    # Optional: C JSON parser for the multi-MB UNESCO list
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from tqdm import tqdm
 import wikipediaapi
 import json
+from collections import defaultdict
+
+def json_loads(data: bytes):
+    """Parse a JSON response body, with orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class RateLimiter:
+    """Spaces wait() returns at least 1/rps seconds apart across all threads"""
+    def __init__(self, rps: float):
+        self.min_interval = 1.0 / rps
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+    
+    def wait(self):
+        # Reserve the next free slot under the lock, sleep outside it; only
+        # callers arriving faster than the rate are delayed
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
 
 class DocumentDownloader:
-    def __init__(self, domain: str, output_dir: str = "./downloaded_docs"):
+    def __init__(self, domain: str, output_dir: str = "./downloaded_docs", requests_per_second: float = 10):
         self.domain = domain
         self.output_dir = Path(output_dir) / domain
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.stats = {"total": 0, "success": 0, "failed": 0}
+        
+        # One pooled session per downloader: repeat requests to a host reuse
+        # the open connection instead of a new TCP + TLS handshake each time
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['User-Agent'] = 'DomainDocCollector/1.0'
+        self.rate_limiter = RateLimiter(requests_per_second)
+        
+        # ETag / Last-Modified of each source as last saved, so re-runs can
+        # skip sources that have not changed
+        self.etag_cache_path = self.output_dir / '.etag_cache.json'
+        self.etag_cache = {}
+        if self.etag_cache_path.exists():
+            try:
+                self.etag_cache = json.loads(self.etag_cache_path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                self.etag_cache = {}
+        self.etag_lock = threading.Lock()
+        self.created_dirs = set()
+    
+    def conditional_get(self, url: str, **kwargs):
+        """
+        GET through the pooled session, revalidating the last saved copy
+        Returns None when the server answers 304 Not Modified
+        """
+        headers = {}
+        entry = self.etag_cache.get(url)
+        # Only revalidate while every file saved from the URL is still on disk
+        if entry and all(Path(path).exists() for path in entry['paths']):
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        
+        response = self.session.get(url, headers=headers, **kwargs)
+        if response.status_code == 304:
+            return None
+        return response
+    
+    def remember(self, url: str, response, paths: list):
+        """Record the validators of a response once its files are written"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        with self.etag_lock:
+            self.etag_cache[url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'paths': [str(path) for path in paths]
+            }
+    
+    def save_etag_cache(self):
+        with self.etag_lock:
+            self.etag_cache_path.write_text(json.dumps(self.etag_cache, indent=2), encoding='utf-8')
+    
+    def parse_csv(self, content: bytes, max_rows: int = None) -> tuple:
+        """
+        Column names, row count and text of a downloaded CSV
+        The text is the file as served, or its first max_rows rows
+        """
+        if PYARROW_AVAILABLE:
+            table = pa_csv.read_csv(pa.BufferReader(content))
+            columns, rows = table.column_names, table.num_rows
+            if max_rows is not None and rows > max_rows:
+                sink = pa.BufferOutputStream()
+                pa_csv.write_csv(table.slice(0, max_rows), sink)
+                return columns, rows, sink.getvalue().to_pybytes().decode('utf-8')
+        else:
+            df = pd.read_csv(io.BytesIO(content))
+            columns, rows = list(df.columns), len(df)
+            if max_rows is not None and rows > max_rows:
+                return columns, rows, df.head(max_rows).to_csv(index=False)
+        
+        return columns, rows, content.decode('utf-8', errors='replace')
+    
+    def output_folder(self, name: str) -> Path:
+        """Subfolder of output_dir, created the first time it is asked for"""
+        path = self.output_dir / name
+        if path not in self.created_dirs:
+            path.mkdir(exist_ok=True)
+            self.created_dirs.add(path)
+        return path
+    
+    def save_document(self, path: Path, title: str, fields: dict, body: str):
+        """Write '# title', a 'Key: value' line per field, then body, in one write"""
+        header = f"# {title}\n\n" + "".join(f"{key}: {value}\n" for key, value in fields.items())
+        path.write_text(f"{header}\n{body}", encoding='utf-8')
     
     def log(self, message):
-        print(f"[{self.domain.upper()}] {message}")
+        # tqdm.write prints above any active progress bar instead of
+        # breaking it across lines
+        tqdm.write(f"[{self.domain.upper()}] {message}")
 
 # ==================== TRAVEL DOWNLOADER ====================
 
 class TravelDocumentDownloader(DocumentDownloader):
     
-    def download_wikivoyage(self, cities: list):
-        """Download city guides from Wikivoyage"""
+    def download_wikivoyage(self, cities: list, max_workers: int = 8):
+        """Download city guides from Wikivoyage, several cities at a time"""
+        # Repeated cities would have two workers writing the same file
+        cities = list(dict.fromkeys(cities))
         self.log(f"Downloading {len(cities)} city guides from Wikivoyage...")
         
-        wiki = wikipediaapi.Wikipedia(
-            language='en',
-            user_agent='DomainDocCollector/1.0'
-        )
+        output_path = self.output_folder("destinations")
         
-        output_path = self.output_dir / "destinations"
-        output_path.mkdir(exist_ok=True)
+        # One client per worker thread; the shared limiter caps the combined
+        # request rate of all workers
+        local = threading.local()
         
-        for city in tqdm(cities, desc="Wikivoyage"):
+        def download_city(city):
+            if not hasattr(local, 'wiki'):
+                local.wiki = wikipediaapi.Wikipedia(
+                    language='en',
+                    user_agent='DomainDocCollector/1.0'
+                )
             try:
-                page = wiki.page(city)
-                if page.exists():
-                    filename = output_path / f"{city.replace(' ', '_')}.txt"
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        f.write(f"# {city} Travel Guide\n\n")
-                        f.write(f"Source: Wikivoyage\n")
-                        f.write(f"URL: {page.fullurl}\n\n")
-                        f.write(page.text)
-                    
-                    self.stats["success"] += 1
-                else:
-                    self.stats["failed"] += 1
-                
-                time.sleep(0.5)  # Rate limiting
+                self.rate_limiter.wait()
+                page = local.wiki.page(city)
+                if not page.exists():
+                    return False
+                self.save_document(
+                    output_path / f"{city.replace(' ', '_')}.txt",
+                    f"{city} Travel Guide",
+                    {"Source": "Wikivoyage", "URL": page.fullurl},
+                    page.text
+                )
+                return True
             
             except Exception as e:
                 self.log(f"Error downloading {city}: {str(e)}")
-                self.stats["failed"] += 1
+                return False
         
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            downloaded = sum(tqdm(pool.map(download_city, cities), total=len(cities), desc="Wikivoyage"))
+        
+        self.stats["success"] += downloaded
+        self.stats["failed"] += len(cities) - downloaded
         self.stats["total"] += len(cities)
         self.log(f"✅ Wikivoyage: {self.stats['success']}/{len(cities)} downloaded")
     
@@ -67,8 +212,7 @@ class TravelDocumentDownloader(DocumentDownloader):
         """Download OpenFlights airport and route data"""
         self.log("Downloading OpenFlights data...")
         
-        output_path = self.output_dir / "transportation"
-        output_path.mkdir(exist_ok=True)
+        output_path = self.output_folder("transportation")
         
         datasets = {
             'airports': 'https://raw.githubusercontent.com/jpatokal/openflights/master/data/airports.dat',
@@ -76,63 +220,88 @@ class TravelDocumentDownloader(DocumentDownloader):
             'routes': 'https://raw.githubusercontent.com/jpatokal/openflights/master/data/routes.dat'
         }
         
-        for name, url in datasets.items():
+        def download_dataset(item):
+            """True if saved or unchanged, False on error, None for other statuses"""
+            name, url = item
             try:
-                response = requests.get(url, timeout=30)
-                if response.status_code == 200:
+                response = self.conditional_get(url, timeout=30)
+                if response is None:
+                    self.log(f"⏭️  {name} unchanged")
+                    return True
+                elif response.status_code == 200:
                     filename = output_path / f"openflights_{name}.txt"
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        f.write(f"# OpenFlights {name.title()} Data\n\n")
-                        f.write(f"Source: OpenFlights\n")
-                        f.write(f"URL: {url}\n\n")
-                        f.write(response.text)
+                    self.save_document(
+                        filename,
+                        f"OpenFlights {name.title()} Data",
+                        {"Source": "OpenFlights", "URL": url},
+                        response.text
+                    )
+                    self.remember(url, response, [filename])
                     
-                    self.stats["success"] += 1
                     self.log(f"✅ Downloaded {name}")
+                    return True
+                return None
             
             except Exception as e:
                 self.log(f"❌ Failed to download {name}: {str(e)}")
-                self.stats["failed"] += 1
+                return False
+        
+        # The three files are independent; fetch them in parallel over the pooled session
+        with ThreadPoolExecutor(max_workers=len(datasets)) as pool:
+            results = list(pool.map(download_dataset, datasets.items()))
         
+        self.stats["success"] += results.count(True)
+        self.stats["failed"] += results.count(False)
         self.stats["total"] += len(datasets)
     
     def download_unesco_sites(self):
         """Download UNESCO World Heritage Sites data"""
         self.log("Downloading UNESCO sites...")
         
-        output_path = self.output_dir / "destinations"
-        output_path.mkdir(exist_ok=True)
+        output_path = self.output_folder("destinations")
         
         try:
             # UNESCO API
             url = 'https://whc.unesco.org/en/list/json'
-            response = requests.get(url, timeout=30)
+            response = self.conditional_get(url, timeout=30)
             
-            if response.status_code == 200:
-                sites = response.json()
+            if response is None:
+                self.log("⏭️  UNESCO data unchanged")
+            else:
+                # Fail on error pages before trying to parse them as JSON
+                response.raise_for_status()
+                sites = json_loads(response.content)
                 
                 # Group by country and save
-                countries = {}
+                countries = defaultdict(list)
                 for site in sites.get('sites', []):
-                    country = site.get('states', 'Unknown')
-                    if country not in countries:
-                        countries[country] = []
-                    countries[country].append(site)
+                    countries[site.get('states', 'Unknown')].append(site)
                 
-                for country, country_sites in countries.items():
+                # Build each country's document in memory, then write it in one call
+                def write_country(item):
+                    country, country_sites = item
+                    body = "".join(
+                        f"## {site.get('site', 'Unknown')}\n"
+                        f"Category: {site.get('category', 'N/A')}\n"
+                        f"Year Inscribed: {site.get('date_inscribed', 'N/A')}\n"
+                        f"Description: {site.get('short_description', 'N/A')}\n\n"
+                        for site in country_sites
+                    )
                     filename = output_path / f"unesco_{country.replace(' ', '_')}.txt"
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        f.write(f"# UNESCO World Heritage Sites in {country}\n\n")
-                        f.write(f"Total Sites: {len(country_sites)}\n\n")
-                        
-                        for site in country_sites:
-                            f.write(f"## {site.get('site', 'Unknown')}\n")
-                            f.write(f"Category: {site.get('category', 'N/A')}\n")
-                            f.write(f"Year Inscribed: {site.get('date_inscribed', 'N/A')}\n")
-                            f.write(f"Description: {site.get('short_description', 'N/A')}\n\n")
-                    
-                    self.stats["success"] += 1
+                    self.save_document(
+                        filename,
+                        f"UNESCO World Heritage Sites in {country}",
+                        {"Total Sites": len(country_sites)},
+                        body
+                    )
+                    return filename
                 
+                # One file per country; overlap the writes
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    written = list(pool.map(write_country, countries.items()))
+                self.stats["success"] += len(written)
+                
+                self.remember(url, response, written)
                 self.log(f"✅ Downloaded UNESCO data for {len(countries)} countries")
         
         except Exception as e:
@@ -163,6 +332,7 @@ class TravelDocumentDownloader(DocumentDownloader):
         self.download_wikivoyage(cities[:100])  # Start with 100 cities
         self.download_openflights_data()
         self.download_unesco_sites()
+        self.save_etag_cache()
         
         return self.stats
 
@@ -174,8 +344,7 @@ class RealEstateDocumentDownloader(DocumentDownloader):
         """Download Zillow research data"""
         self.log("Downloading Zillow data...")
         
-        output_path = self.output_dir / "price_prediction"
-        output_path.mkdir(exist_ok=True)
+        output_path = self.output_folder("price_prediction")
         
         datasets = {
             'home_values': 'https://files.zillowstatic.com/research/public_csvs/zhvi/Metro_zhvi_uc_sfrcondo_tier_0.33_0.67_sm_sa_month.csv',
@@ -184,27 +353,39 @@ class RealEstateDocumentDownloader(DocumentDownloader):
             'median_sale_price': 'https://files.zillowstatic.com/research/public_csvs/median_sale_price/Metro_median_sale_price_uc_sfrcondo_sm_month.csv'
         }
         
-        for name, url in tqdm(datasets.items(), desc="Zillow"):
+        def download_dataset(item):
+            name, url = item
             try:
-                df = pd.read_csv(url)
+                response = self.conditional_get(url, timeout=60)
+                if response is None:
+                    self.log(f"⏭️  {name} unchanged")
+                    return True
+                response.raise_for_status()
+                columns, rows, csv_text = self.parse_csv(response.content)
                 
-                # Convert to text format
+                # Header plus the CSV as served; a formatted table adds only padding
                 filename = output_path / f"zillow_{name}.txt"
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(f"# Zillow {name.replace('_', ' ').title()}\n\n")
-                    f.write(f"Source: Zillow Research\n")
-                    f.write(f"Columns: {', '.join(df.columns)}\n")
-                    f.write(f"Rows: {len(df)}\n\n")
-                    f.write(df.to_string())
+                self.save_document(
+                    filename,
+                    f"Zillow {name.replace('_', ' ').title()}",
+                    {"Source": "Zillow Research", "Columns": ', '.join(columns), "Rows": rows},
+                    csv_text
+                )
+                self.remember(url, response, [filename])
                 
-                self.stats["success"] += 1
                 self.log(f"✅ Downloaded {name}")
-                time.sleep(1)
+                return True
             
             except Exception as e:
                 self.log(f"❌ Failed to download {name}: {str(e)}")
-                self.stats["failed"] += 1
+                return False
+        
+        # The CSVs are independent; fetch them in parallel over the pooled session
+        with ThreadPoolExecutor(max_workers=len(datasets)) as pool:
+            downloaded = sum(tqdm(pool.map(download_dataset, datasets.items()), total=len(datasets), desc="Zillow"))
         
+        self.stats["success"] += downloaded
+        self.stats["failed"] += len(datasets) - downloaded
         self.stats["total"] += len(datasets)
     
     def download_fred_data(self, api_key: str = None):
@@ -220,8 +401,7 @@ class RealEstateDocumentDownloader(DocumentDownloader):
             from fredapi import Fred
             fred = Fred(api_key=api_key)
             
-            output_path = self.output_dir / "economic_factors"
-            output_path.mkdir(exist_ok=True)
+            output_path = self.output_folder("economic_factors")
             
             series = {
                 'MORTGAGE30US': '30-Year Mortgage Rate',
@@ -233,25 +413,33 @@ class RealEstateDocumentDownloader(DocumentDownloader):
                 'FEDFUNDS': 'Federal Funds Rate'
             }
             
-            for series_id, name in tqdm(series.items(), desc="FRED"):
+            def download_series(item):
+                series_id, name = item
                 try:
                     data = fred.get_series(series_id)
                     
-                    filename = output_path / f"fred_{series_id}.txt"
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        f.write(f"# {name}\n\n")
-                        f.write(f"Series ID: {series_id}\n")
-                        f.write(f"Source: Federal Reserve Economic Data (FRED)\n")
-                        f.write(f"Data Points: {len(data)}\n\n")
-                        f.write(data.to_string())
-                    
-                    self.stats["success"] += 1
-                    time.sleep(0.5)
+                    self.save_document(
+                        output_path / f"fred_{series_id}.txt",
+                        name,
+                        {
+                            "Series ID": series_id,
+                            "Source": "Federal Reserve Economic Data (FRED)",
+                            "Data Points": len(data)
+                        },
+                        data.to_string()
+                    )
+                    return True
                 
                 except Exception as e:
                     self.log(f"❌ Failed to download {series_id}: {str(e)}")
-                    self.stats["failed"] += 1
+                    return False
             
+            # A few series at a time keeps well under FRED's 120 requests/minute
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                downloaded = sum(tqdm(pool.map(download_series, series.items()), total=len(series), desc="FRED"))
+            
+            self.stats["success"] += downloaded
+            self.stats["failed"] += len(series) - downloaded
             self.stats["total"] += len(series)
             self.log(f"✅ FRED: {self.stats['success']} series downloaded")
         
@@ -262,8 +450,7 @@ class RealEstateDocumentDownloader(DocumentDownloader):
         """Download Redfin market data - ALTERNATIVE SOURCES"""
         self.log("Downloading Redfin alternative data...")
         
-        output_path = self.output_dir / "market_intelligence"
-        output_path.mkdir(exist_ok=True)
+        output_path = self.output_folder("market_intelligence")
         
         # Alternative 1: Realtor.com (works!)
         self.log("Using Realtor.com as alternative...")
@@ -275,19 +462,26 @@ class RealEstateDocumentDownloader(DocumentDownloader):
         
         for name, url in tqdm(datasets.items(), desc="Realtor.com"):
             try:
-                df = pd.read_csv(url)
+                self.rate_limiter.wait()
+                response = self.conditional_get(url, timeout=60)
+                if response is None:
+                    self.stats["success"] += 1
+                    self.log(f"⏭️  {name} unchanged")
+                    continue
+                response.raise_for_status()
+                columns, rows, csv_text = self.parse_csv(response.content, max_rows=1000)
                 
                 filename = output_path / f"realtor_{name}.txt"
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(f"# Realtor.com {name.replace('_', ' ').title()}\n\n")
-                    f.write(f"Source: Realtor.com Research\n")
-                    f.write(f"Columns: {', '.join(df.columns)}\n")
-                    f.write(f"Rows: {len(df)}\n\n")
-                    f.write(df.head(1000).to_string())
+                self.save_document(
+                    filename,
+                    f"Realtor.com {name.replace('_', ' ').title()}",
+                    {"Source": "Realtor.com Research", "Columns": ', '.join(columns), "Rows": rows},
+                    csv_text
+                )
+                self.remember(url, response, [filename])
                 
                 self.stats["success"] += 1
                 self.log(f"✅ Downloaded {name}")
-                time.sleep(1)
             
             except Exception as e:
                 self.log(f"❌ Failed to download {name}: {str(e)}")
@@ -299,8 +493,7 @@ class RealEstateDocumentDownloader(DocumentDownloader):
         """Download additional free real estate data"""
         self.log("Downloading additional sources...")
         
-        output_path = self.output_dir / "historical_data"
-        output_path.mkdir(exist_ok=True)
+        output_path = self.output_folder("historical_data")
         
         # HUD (Housing and Urban Development) data
         try:
@@ -322,6 +515,7 @@ class RealEstateDocumentDownloader(DocumentDownloader):
         self.download_zillow_data()
         self.download_fred_data(fred_api_key)
         self.download_redfin_data()
+        self.save_etag_cache()
         
         return self.stats
 
@@ -6,24 +6,44 @@ Supports: PDF, DOCX, TXT, CSV, XLSX, Images
 
 import os
 import sys
+import io
+import mmap
+import queue
+import itertools
+import threading
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
 import logging
+import logging.handlers
+import atexit
 from typing import List, Dict
 import pandas as pd
+try:
+    # Optional: Rust Excel reader (pandas >= 2.2), much faster than openpyxl
+    import python_calamine
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None  # pandas default
 from dotenv import load_dotenv
 
 # Import from existing app2.py
 from app2 import ingest_document, extract_text_from_file
 
-# Setup logging
+# Setup logging: worker threads only enqueue records; one listener thread
+# writes the log file so file I/O stays off the ingestion path
+log_queue = queue.Queue(-1)
+log_listener = logging.handlers.QueueListener(log_queue, logging.FileHandler('bulk_ingestion.log', delay=True))
+log_listener.start()
+atexit.register(log_listener.stop)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('bulk_ingestion.log'),
+        logging.handlers.QueueHandler(log_queue),
         logging.StreamHandler()
-    ]
+    ],
+    force=True  # app2 has already configured the root logger on import
 )
 logger = logging.getLogger(__name__)
 
@@ -32,7 +52,8 @@ load_dotenv()
 
 # Configuration
 DATA_ROOT = "data"  # Root folder for all documents
-SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.txt', '.csv', '.xlsx', '.png', '.jpg', '.jpeg', '.tiff', '.bmp']
+SUPPORTED_EXTENSIONS = frozenset({'.pdf', '.docx', '.txt', '.csv', '.xlsx', '.png', '.jpg', '.jpeg', '.tiff', '.bmp'})
+MMAP_MIN_SIZE = 50 * 1024 * 1024  # Text files at least this big are memory-mapped
 
 # Domain mapping based on folder structure
 DOMAIN_MAPPING = {
@@ -49,15 +70,18 @@ class BulkIngestionStats:
         self.total_chunks = 0
         self.start_time = datetime.now()
         self.errors = []
+        self.lock = threading.Lock()  # Files are ingested on worker threads
     
     def add_success(self, filename: str, chunks: int):
-        self.successful += 1
-        self.total_chunks += chunks
+        with self.lock:
+            self.successful += 1
+            self.total_chunks += chunks
         logger.info(f"✅ SUCCESS: {filename} ({chunks} chunks)")
     
     def add_failure(self, filename: str, error: str):
-        self.failed += 1
-        self.errors.append({'file': filename, 'error': error})
+        with self.lock:
+            self.failed += 1
+            self.errors.append({'file': filename, 'error': error})
         logger.error(f"❌ FAILED: {filename} - {error}")
     
     def print_summary(self):
@@ -79,100 +103,134 @@ class BulkIngestionStats:
             if len(self.errors) > 10:
                 logger.info(f"  ... and {len(self.errors) - 10} more errors")
 
+def _domain_from_name(name: str):
+    """'real_estate' or 'travel' if the path component names one, else None"""
+    name = name.lower()
+    if 'real_estate' in name:
+        return 'real_estate'
+    elif 'travel' in name:
+        return 'travel'
+    return None
+
+@lru_cache(maxsize=None)
+def _domain_from_dir(directory: Path):
+    """First domain named along a directory path; shared by all files in it"""
+    for part in directory.parts:
+        domain = _domain_from_name(part)
+        if domain:
+            return domain
+    return None
+
 def detect_domain_from_path(file_path: Path) -> str:
     """Detect domain based on folder structure"""
-    parts = file_path.parts
-    
-    # Check if 'real_estate' or 'travel' in path
-    for part in parts:
-        if 'real_estate' in part.lower():
-            return 'real_estate'
-        elif 'travel' in part.lower():
-            return 'travel'
-    
-    # Default to travel
-    return 'travel'
+    # Check if 'real_estate' or 'travel' in path: folders first, then the
+    # file name; default to travel
+    return _domain_from_dir(file_path.parent) or _domain_from_name(file_path.name) or 'travel'
 
-def process_csv_file(file_path: Path) -> str:
-    """Convert CSV to text format for ingestion"""
+def rows_as_text(df: pd.DataFrame, limit: int) -> str:
+    """First rows of a frame as 'Row <index>: <col>: <value> | ...' lines"""
+    sample = df.head(limit)
+    # Plain tuples per row instead of iterrows(), which builds a Series per row
+    rows = sample.itertuples(index=False, name=None)
+    prefixes = [f"{col}: " for col in sample.columns]
+    return "".join(
+        f"Row {idx}: {' | '.join(f'{prefix}{value}' for prefix, value in zip(prefixes, values))}\n"
+        for idx, values in zip(sample.index, rows)
+    )
+
+def process_csv_file(file_path: Path) -> bytes:
+    """Convert CSV to UTF-8 text for ingestion"""
     try:
         df = pd.read_csv(file_path)
         
+        # Encode each part straight into one buffer, so the document is never
+        # held as both a joined str and its encoded bytes
+        buf = io.BytesIO()
+        write = lambda text: buf.write(text.encode('utf-8'))
+        
         # Create a text representation
-        text_parts = [f"Data from: {file_path.name}\n"]
-        text_parts.append(f"Columns: {', '.join(df.columns)}\n\n")
+        write(f"Data from: {file_path.name}\n")
+        write(f"Columns: {', '.join(df.columns)}\n\n")
         
-        # Add summary statistics
-        text_parts.append("Summary Statistics:\n")
-        text_parts.append(df.describe().to_string())
-        text_parts.append("\n\n")
+        # Add summary statistics; text-only data has none worth computing
+        if not df.select_dtypes('number').empty:
+            write("Summary Statistics:\n")
+            write(df.describe().to_string())
+            write("\n\n")
         
         # Add first 100 rows as text
-        text_parts.append("Data Sample:\n")
-        for idx, row in df.head(100).iterrows():
-            row_text = " | ".join([f"{col}: {val}" for col, val in row.items()])
-            text_parts.append(f"Row {idx}: {row_text}\n")
+        write("Data Sample:\n")
+        write(rows_as_text(df, 100))
         
-        return "".join(text_parts)
+        return buf.getvalue()
     
     except Exception as e:
         logger.error(f"Failed to process CSV {file_path}: {str(e)}")
         return None
 
-def process_excel_file(file_path: Path) -> str:
-    """Convert Excel to text format for ingestion"""
+def process_excel_file(file_path: Path) -> bytes:
+    """Convert Excel to UTF-8 text for ingestion"""
     try:
-        # Read all sheets
-        excel_file = pd.ExcelFile(file_path)
-        text_parts = [f"Data from: {file_path.name}\n"]
+        # Read all sheets in one pass over the workbook
+        sheets = pd.read_excel(file_path, sheet_name=None, engine=EXCEL_ENGINE)
+        buf = io.BytesIO()
+        write = lambda text: buf.write(text.encode('utf-8'))
+        write(f"Data from: {file_path.name}\n")
         
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            text_parts.append(f"\n{'='*80}\n")
-            text_parts.append(f"Sheet: {sheet_name}\n")
-            text_parts.append(f"{'='*80}\n")
-            text_parts.append(f"Columns: {', '.join(df.columns)}\n\n")
+        for sheet_name, df in sheets.items():
+            write(f"\n{'='*80}\n")
+            write(f"Sheet: {sheet_name}\n")
+            write(f"{'='*80}\n")
+            write(f"Columns: {', '.join(df.columns)}\n\n")
             
-            # Add summary
-            text_parts.append("Summary:\n")
-            text_parts.append(df.describe().to_string())
-            text_parts.append("\n\n")
+            # Add summary; skipped for sheets without numeric data
+            if not df.select_dtypes('number').empty:
+                write("Summary:\n")
+                write(df.describe().to_string())
+                write("\n\n")
             
             # Add sample data
-            text_parts.append("Data Sample:\n")
-            for idx, row in df.head(50).iterrows():
-                row_text = " | ".join([f"{col}: {val}" for col, val in row.items()])
-                text_parts.append(f"Row {idx}: {row_text}\n")
+            write("Data Sample:\n")
+            write(rows_as_text(df, 50))
         
-        return "".join(text_parts)
+        return buf.getvalue()
     
     except Exception as e:
         logger.error(f"Failed to process Excel {file_path}: {str(e)}")
         return None
 
-def ingest_single_file(file_path: Path, domain: str, stats: BulkIngestionStats, user_id: str = None):
-    """Ingest a single file"""
-    try:
-        # Read file content
+def load_file(file_path: Path, size: int = 0):
+    """
+    Read a file into what ingest_document takes; size is the byte count
+    from the folder scan. Returns None if a CSV/Excel rendering fails
+    """
+    suffix = file_path.suffix.lower()
+    
+    # Special handling for CSV and Excel: ingest a text rendering
+    # instead of the raw file
+    if suffix == '.csv':
+        return process_csv_file(file_path)
+    
+    elif suffix in ['.xlsx', '.xls']:
+        return process_excel_file(file_path)
+    
+    elif suffix == '.txt' and size >= MMAP_MIN_SIZE:
+        # Decode large text files straight from a read-only mapping
+        # instead of first copying them into a bytes object; the mapping
+        # stays valid after the file is closed
         with open(file_path, 'rb') as f:
-            file_content = f.read()
-        
-        # Special handling for CSV and Excel
-        if file_path.suffix.lower() == '.csv':
-            text_content = process_csv_file(file_path)
-            if text_content:
-                file_content = text_content.encode('utf-8')
-            else:
-                stats.add_failure(file_path.name, "CSV processing failed")
-                return
-        
-        elif file_path.suffix.lower() in ['.xlsx', '.xls']:
-            text_content = process_excel_file(file_path)
-            if text_content:
-                file_content = text_content.encode('utf-8')
-            else:
-                stats.add_failure(file_path.name, "Excel processing failed")
-                return
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    # Read file content
+    return file_path.read_bytes()
+
+def ingest_content(file_path: Path, file_content, domain: str, stats: BulkIngestionStats, user_id: str = None):
+    """Ingest a file loaded by load_file"""
+    try:
+        if file_content is None:
+            kind = 'CSV' if file_path.suffix.lower() == '.csv' else 'Excel'
+            stats.add_failure(file_path.name, f"{kind} processing failed")
+            return
         
         # Ingest document
         result = ingest_document(file_content, file_path.name, domain, user_id)
@@ -184,24 +242,109 @@ def ingest_single_file(file_path: Path, domain: str, stats: BulkIngestionStats,
     
     except Exception as e:
         stats.add_failure(file_path.name, str(e))
+    
+    finally:
+        if isinstance(file_content, mmap.mmap):
+            file_content.close()
+
+def ingest_single_file(file_path: Path, domain: str, stats: BulkIngestionStats, user_id: str = None,
+                       size: int = 0):
+    """Ingest a single file; size is the byte count from the folder scan"""
+    try:
+        file_content = load_file(file_path, size)
+    except Exception as e:
+        stats.add_failure(file_path.name, str(e))
+        return
+    ingest_content(file_path, file_content, domain, stats, user_id)
+
+def ingest_files(documents: List[tuple], stats: BulkIngestionStats, user_id: str = None,
+                 workers: int = 8, batch_size: int = 10, readers: int = 2):
+    """
+    Ingest (file_path, domain, size) tuples through a read -> ingest pipeline
+    Reader threads load files (and render CSV/Excel) into a bounded queue
+    that the ingestion workers drain, so disk reads overlap text extraction,
+    embedding and Pinecone upserts while at most 2 * workers loaded files
+    wait in memory
+    """
+    pending = queue.Queue()
+    for document in documents:
+        pending.put(document)
+    loaded = queue.Queue(maxsize=2 * workers)
+    processed = itertools.count(1)
+    
+    def read():
+        while True:
+            try:
+                file_path, domain, size = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                loaded.put((file_path, domain, size, load_file(file_path, size), None))
+            except Exception as e:
+                loaded.put((file_path, domain, size, None, e))
+    
+    def ingest():
+        while (item := loaded.get()) is not None:
+            file_path, domain, size, file_content, error = item
+            logger.info(f"Processing: {file_path.name} (domain: {domain}, {size / 1024:.2f} KB)")
+            if error is not None:
+                stats.add_failure(file_path.name, str(error))
+            else:
+                ingest_content(file_path, file_content, domain, stats, user_id)
+            
+            # Progress update every batch_size files
+            with stats.lock:
+                idx = next(processed)
+            if idx % batch_size == 0:
+                logger.info(f"\n📊 Progress: {idx}/{len(documents)} files processed")
+                logger.info(f"   Success: {stats.successful}, Failed: {stats.failed}")
+    
+    reader_threads = [threading.Thread(target=read, daemon=True) for _ in range(readers)]
+    ingest_threads = [threading.Thread(target=ingest, daemon=True) for _ in range(workers)]
+    for thread in reader_threads + ingest_threads:
+        thread.start()
+    
+    # One sentinel per ingestion worker once every file has been queued
+    for thread in reader_threads:
+        thread.join()
+    for _ in ingest_threads:
+        loaded.put(None)
+    for thread in ingest_threads:
+        thread.join()
+
+def scan_documents(root: Path) -> List[tuple]:
+    """(file_path, size) for every supported file under root"""
+    # os.scandir hands back DirEntry objects whose type (and, on Windows,
+    # size) come with the directory listing, so each file is stat'ed at
+    # most once and the size is reused for logging
+    files = []
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        files.append((Path(entry.path), entry.stat().st_size))
+        except OSError as e:
+            logger.warning(f"Skipping unreadable folder: {e}")
+    return files
 
 def find_all_documents(root_path: str) -> List[tuple]:
-    """Find all documents in folder structure"""
-    documents = []
+    """Find all documents in folder structure as (file_path, domain, size)"""
     root = Path(root_path)
     
     if not root.exists():
         logger.error(f"Root path does not exist: {root_path}")
-        return documents
+        return []
     
-    for file_path in root.rglob('*'):
-        if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-            domain = detect_domain_from_path(file_path)
-            documents.append((file_path, domain))
-    
-    return documents
+    return [
+        (file_path, detect_domain_from_path(file_path), size)
+        for file_path, size in scan_documents(root)
+    ]
 
-def ingest_by_category(root_path: str, user_id: str = None, batch_size: int = 10):
+def ingest_by_category(root_path: str, user_id: str = None, batch_size: int = 10, workers: int = 8):
     """Ingest documents with progress tracking"""
     
     logger.info("="*80)
@@ -209,7 +352,7 @@ def ingest_by_category(root_path: str, user_id: str = None, batch_size: int = 10
     logger.info("="*80)
     logger.info(f"Root Path: {root_path}")
     logger.info(f"User ID: {user_id or 'None (general)'}")
-    logger.info(f"Supported Extensions: {', '.join(SUPPORTED_EXTENSIONS)}")
+    logger.info(f"Supported Extensions: {', '.join(sorted(SUPPORTED_EXTENSIONS))}")
     logger.info("="*80)
     
     # Find all documents
@@ -224,7 +367,7 @@ def ingest_by_category(root_path: str, user_id: str = None, batch_size: int = 10
     
     # Group by domain
     by_domain = {}
-    for file_path, domain in documents:
+    for file_path, domain, _ in documents:
         if domain not in by_domain:
             by_domain[domain] = []
         by_domain[domain].append(file_path)
@@ -247,17 +390,7 @@ def ingest_by_category(root_path: str, user_id: str = None, batch_size: int = 10
     # Ingest documents
     logger.info("\n🚀 Starting ingestion...\n")
     
-    for idx, (file_path, domain) in enumerate(documents, 1):
-        logger.info(f"\n[{idx}/{len(documents)}] Processing: {file_path.name}")
-        logger.info(f"  Domain: {domain}")
-        logger.info(f"  Size: {file_path.stat().st_size / 1024:.2f} KB")
-        
-        ingest_single_file(file_path, domain, stats, user_id)
-        
-        # Progress update every batch_size files
-        if idx % batch_size == 0:
-            logger.info(f"\n📊 Progress: {idx}/{len(documents)} files processed")
-            logger.info(f"   Success: {stats.successful}, Failed: {stats.failed}")
+    ingest_files(documents, stats, user_id, workers, batch_size)
     
     # Print final summary
     stats.print_summary()
@@ -274,7 +407,7 @@ def ingest_by_category(root_path: str, user_id: str = None, batch_size: int = 10
                 f.write("-"*80 + "\n")
         logger.info(f"\n📝 Error log saved to: {error_log_path}")
 
-def ingest_specific_folder(folder_path: str, domain: str, user_id: str = None):
+def ingest_specific_folder(folder_path: str, domain: str, user_id: str = None, workers: int = 8):
     """Ingest all documents from a specific folder"""
     logger.info(f"Ingesting from folder: {folder_path}")
     logger.info(f"Domain: {domain}")
@@ -286,11 +419,9 @@ def ingest_specific_folder(folder_path: str, domain: str, user_id: str = None):
     
     stats = BulkIngestionStats()
     
-    for file_path in folder.rglob('*'):
-        if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-            stats.total_files += 1
-            logger.info(f"\nProcessing: {file_path.name}")
-            ingest_single_file(file_path, domain, stats, user_id)
+    documents = [(file_path, domain, size) for file_path, size in scan_documents(folder)]
+    stats.total_files = len(documents)
+    ingest_files(documents, stats, user_id, workers)
     
     stats.print_summary()
 
@@ -303,6 +434,7 @@ if __name__ == "__main__":
     parser.add_argument('--domain', type=str, choices=['travel', 'real_estate'], help='Domain (required if using --folder)')
     parser.add_argument('--user-id', type=str, help='User ID for document tagging')
     parser.add_argument('--batch-size', type=int, default=10, help='Progress update frequency')
+    parser.add_argument('--workers', type=int, default=8, help='Files ingested concurrently')
     
     args = parser.parse_args()
     
@@ -310,6 +442,6 @@ if __name__ == "__main__":
         if not args.domain:
             logger.error("--domain is required when using --folder")
             sys.exit(1)
-        ingest_specific_folder(args.folder, args.domain, args.user_id)
+        ingest_specific_folder(args.folder, args.domain, args.user_id, args.workers)
     else:
-        ingest_by_category(args.root, args.user_id, args.batch_size)
+        ingest_by_category(args.root, args.user_id, args.batch_size, args.workers)
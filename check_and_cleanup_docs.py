@@ -2,34 +2,32 @@
 Check for duplicate documents and optionally clean them up
 """
 
-import requests
 import json
-from collections import defaultdict
+from collections import Counter, defaultdict
+from check_documents import cached_get, DIAG_CACHE_TTL
 
 API_BASE_URL = "http://localhost:8000"
 USER_ID = "travel_analyst_001"
 
-def check_documents():
+def check_documents(ttl=DIAG_CACHE_TTL):
     """Check what documents are uploaded"""
     print("=" * 80)
     print("CHECKING DOCUMENTS")
     print("=" * 80)
     
     try:
-        response = requests.get(f"{API_BASE_URL}/user-documents/{USER_ID}", timeout=10)
+        status_code, result = cached_get(f"{API_BASE_URL}/user-documents/{USER_ID}", timeout=10, ttl=ttl)
         
-        if response.status_code == 200:
-            result = response.json()
+        if status_code == 200:
             docs = result.get('documents', [])
             
             print(f"\n📚 Total documents: {len(docs)}")
             print(f"👤 User ID: {USER_ID}\n")
             
-            # Group by filename
-            by_filename = defaultdict(list)
-            for doc in docs:
-                filename = doc.get('filename', 'Unknown')
-                by_filename[filename].append(doc)
+            # Count copies per filename; entries are only collected for
+            # the duplicated names
+            filename_counts = Counter(doc.get('filename', 'Unknown') for doc in docs)
+            duplicates = {filename for filename, count in filename_counts.items() if count > 1}
             
             print("Documents found:\n")
             for i, doc in enumerate(docs, 1):
@@ -42,16 +40,20 @@ def check_documents():
             print("DUPLICATE CHECK")
             print("=" * 80)
             
-            duplicates_found = False
-            for filename, doc_list in by_filename.items():
-                if len(doc_list) > 1:
-                    duplicates_found = True
+            if duplicates:
+                copies = defaultdict(list)
+                for doc in docs:
+                    filename = doc.get('filename', 'Unknown')
+                    if filename in duplicates:
+                        copies[filename].append(doc)
+                
+                for filename, doc_list in copies.items():
                     print(f"\n⚠️ DUPLICATE: {filename}")
                     print(f"   Found {len(doc_list)} copies:")
                     for idx, doc in enumerate(doc_list, 1):
                         print(f"   {idx}. Uploaded: {doc.get('timestamp', 'N/A')[:19]}, Chunks: {doc.get('chunks', 0)}")
             
-            if not duplicates_found:
+            if not duplicates:
                 print("\n✅ No duplicates found!")
             else:
                 print("\n" + "=" * 80)
@@ -66,8 +68,8 @@ def check_documents():
             print("\n" + "=" * 80)
             print("UNIQUE FILES")
             print("=" * 80)
-            print(f"\nYou have {len(by_filename)} unique files:\n")
-            for filename in by_filename.keys():
+            print(f"\nYou have {len(filename_counts)} unique files:\n")
+            for filename in filename_counts:
                 print(f"  ✅ {filename}")
             
             # Check for the 3 expected files
@@ -83,7 +85,7 @@ def check_documents():
             
             all_present = True
             for exp in expected:
-                if exp in by_filename:
+                if exp in filename_counts:
                     print(f"  ✅ {exp}")
                 else:
                     print(f"  ❌ {exp} - MISSING")
@@ -94,27 +96,27 @@ def check_documents():
                 print("\n💡 The duplicates don't affect functionality.")
                 print("   Your multi-document analysis will work correctly.")
             
-            return docs, by_filename
+            return docs, filename_counts
             
         else:
-            print(f"❌ Error: {response.status_code}")
+            print(f"❌ Error: {status_code}")
             return None, None
             
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         return None, None
 
-def main():
+def main(ttl=DIAG_CACHE_TTL):
     print("\n🔍 DOCUMENT CHECK & CLEANUP TOOL\n")
     
-    docs, by_filename = check_documents()
+    docs, filename_counts = check_documents(ttl)
     
     if docs and len(docs) > 3:
         print("\n" + "=" * 80)
         print("SUMMARY")
         print("=" * 80)
         print(f"\n📊 You have {len(docs)} total document entries")
-        print(f"📁 But only {len(by_filename)} unique files")
+        print(f"📁 But only {len(filename_counts)} unique files")
         print("\n✅ This is OK! The system works correctly with duplicates.")
         print("   All 3 source documents are being analyzed properly.")
         print("\n💡 If you want to clean up:")
@@ -125,4 +127,10 @@ def main():
     print("\n" + "=" * 80)
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Check for duplicate documents')
+    parser.add_argument('--no-cache', action='store_true', help='Refetch the document list instead of reusing a recent one')
+    args = parser.parse_args()
+    
+    main(ttl=0 if args.no_cache else DIAG_CACHE_TTL)
@@ -3,24 +3,79 @@ Check what documents are uploaded and test retrieval diversity
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+try:
+    # Optional: C JSON parser for /query responses with their source chunks
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+import time
+import tempfile
+from pathlib import Path
 
 API_BASE_URL = "http://localhost:8000"
 
-def check_user_documents(user_id="travel_analyst_001"):
+# One keep-alive session per run: the health check, document listing and
+# queries all reuse the same connection to the backend
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                     max_retries=Retry(total=2, backoff_factor=0.1)))
+
+def json_loads(data):
+    """Parse a response body, with orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Document listings shared by the diagnostic scripts, so running them back
+# to back fetches each listing once
+DIAG_CACHE_PATH = Path(tempfile.gettempdir()) / "rag_diag_cache.json"
+DIAG_CACHE_TTL = 60  # seconds
+
+def cached_get(url, timeout=10, ttl=DIAG_CACHE_TTL):
+    """
+    GET a JSON endpoint, reusing a successful response fetched by any
+    diagnostic script in the last ttl seconds (ttl=0 always refetches)
+    Returns (status_code, data); data is None unless the status is 200
+    """
+    try:
+        cache = json.loads(DIAG_CACHE_PATH.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        cache = {}
+    
+    entry = cache.get(url)
+    if entry and time.time() - entry['ts'] < ttl:
+        return 200, entry['data']
+    
+    response = SESSION.get(url, timeout=timeout)
+    if response.status_code != 200:
+        return response.status_code, None
+    
+    data = json_loads(response.content)
+    cache[url] = {'ts': time.time(), 'data': data}
+    try:
+        DIAG_CACHE_PATH.write_text(json.dumps(cache), encoding='utf-8')
+    except OSError:
+        pass
+    return 200, data
+
+def check_user_documents(user_id="travel_analyst_001", ttl=DIAG_CACHE_TTL):
     """Check what documents are uploaded for a user"""
     print("=" * 80)
     print(f"CHECKING DOCUMENTS FOR USER: {user_id}")
     print("=" * 80)
     
     try:
-        response = requests.get(
+        status_code, result = cached_get(
             f"{API_BASE_URL}/user-documents/{user_id}",
-            timeout=10
+            timeout=10,
+            ttl=ttl
         )
         
-        if response.status_code == 200:
-            result = response.json()
+        if status_code == 200:
             docs = result.get('documents', [])
             
             print(f"\n📚 Total documents: {len(docs)}")
@@ -60,7 +115,7 @@ def check_user_documents(user_id="travel_analyst_001"):
                 print("   python upload_travel_reports.py")
                 return False
         else:
-            print(f"❌ Error: {response.status_code}")
+            print(f"❌ Error: {status_code}")
             return False
             
     except Exception as e:
@@ -89,14 +144,14 @@ def test_retrieval_diversity(user_id="travel_analyst_001"):
     print(f"User ID: {user_id}")
     
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{API_BASE_URL}/query",
             json=payload,
             timeout=60
         )
         
         if response.status_code == 200:
-            result = response.json()
+            result = json_loads(response.content)
             sources = result.get('sources', [])
             
             print(f"\n📊 Retrieved {len(sources)} chunks")
@@ -149,9 +204,9 @@ def test_retrieval_diversity(user_id="travel_analyst_001"):
 def check_backend():
     """Check if backend is running"""
     try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=5)
+        response = SESSION.get(f"{API_BASE_URL}/health", timeout=5)
         if response.status_code == 200:
-            health = response.json()
+            health = json_loads(response.content)
             print("✅ Backend is running")
             print(f"   Model: {health.get('model', 'N/A')}")
             return True
@@ -162,6 +217,12 @@ def check_backend():
         return False
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Check uploaded documents and retrieval diversity')
+    parser.add_argument('--no-cache', action='store_true', help='Refetch the document list instead of reusing a recent one')
+    args = parser.parse_args()
+    
     print("\n🔍 DOCUMENT & RETRIEVAL DIAGNOSTIC\n")
     
     # Check backend
@@ -171,7 +232,7 @@ if __name__ == "__main__":
     print()
     
     # Check documents
-    docs_ok = check_user_documents()
+    docs_ok = check_user_documents(ttl=0 if args.no_cache else DIAG_CACHE_TTL)
     
     if not docs_ok:
         print("\n⚠️ Documents not properly uploaded!")
@@ -3,6 +3,7 @@ Quick script to check what data is in Pinecone
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pinecone import Pinecone
 
@@ -28,41 +29,44 @@ from sentence_transformers import SentenceTransformer
 
 embedder = SentenceTransformer('all-MiniLM-L6-v2')
 
+# Encoded once; all three queries below reuse the vector with different filters
 test_query = "best hotels in Paris"
 query_embedding = embedder.encode(test_query).tolist()
 
+def run_query(query_filter):
+    """Query the test vector; a None filter queries the whole index"""
+    kwargs = {"filter": query_filter} if query_filter else {}
+    return index.query(
+        vector=query_embedding,
+        top_k=5,
+        include_metadata=True,
+        **kwargs
+    )
+
+# The three variants are independent round trips; send them together
+with ThreadPoolExecutor(max_workers=3) as executor:
+    type_results, domain_results, results = executor.map(
+        run_query, [{"type": "query"}, {"domain": "travel"}, None]
+    )
+
 print("=" * 60)
 print("TEST QUERY: 'best hotels in Paris'")
 print("=" * 60)
 
 # Query with type filter
 print("\n1. Querying with type='query' filter...")
-results = index.query(
-    vector=query_embedding,
-    top_k=5,
-    include_metadata=True,
-    filter={"type": "query"}
-)
-
-print(f"   Results found: {len(results.get('matches', []))}")
-if results.get('matches'):
-    for i, match in enumerate(results['matches'][:3], 1):
+print(f"   Results found: {len(type_results.get('matches', []))}")
+if type_results.get('matches'):
+    for i, match in enumerate(type_results['matches'][:3], 1):
         print(f"   {i}. {match['metadata'].get('query', 'N/A')}")
         print(f"      Intent: {match['metadata'].get('intent', 'N/A')}")
         print(f"      Score: {match['score']:.3f}")
 
 # Query with domain filter
 print("\n2. Querying with domain='travel' filter...")
-results = index.query(
-    vector=query_embedding,
-    top_k=5,
-    include_metadata=True,
-    filter={"domain": "travel"}
-)
-
-print(f"   Results found: {len(results.get('matches', []))}")
-if results.get('matches'):
-    for i, match in enumerate(results['matches'][:3], 1):
+print(f"   Results found: {len(domain_results.get('matches', []))}")
+if domain_results.get('matches'):
+    for i, match in enumerate(domain_results['matches'][:3], 1):
         metadata = match['metadata']
         print(f"   {i}. Type: {metadata.get('type', 'N/A')}")
         print(f"      Query: {metadata.get('query', metadata.get('text', 'N/A')[:50])}")
@@ -71,12 +75,6 @@ if results.get('matches'):
 
 # Query without filter
 print("\n3. Querying without any filter...")
-results = index.query(
-    vector=query_embedding,
-    top_k=5,
-    include_metadata=True
-)
-
 print(f"   Results found: {len(results.get('matches', []))}")
 if results.get('matches'):
     for i, match in enumerate(results['matches'][:3], 1):
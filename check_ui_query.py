@@ -2,10 +2,15 @@
 Check what query parameters the UI is sending
 """
 
-import requests
+import re
+from collections import Counter
+from check_documents import SESSION, json_loads
 
 API_BASE_URL = "http://localhost:8000"
 
+# Source mentions, one group per report: Amadeus, Accenture/Travel Industry, WEF
+MENTION_RE = re.compile(r'(amadeus)|(accenture|travel-industrys)|(wef|world economic)', re.IGNORECASE)
+
 # Test with the exact same settings as UI should use
 payload = {
     "query": "What is the similarity between them?",
@@ -28,25 +33,24 @@ print(f"  Domain: {payload['domain']}")
 print()
 
 try:
-    response = requests.post(
+    response = SESSION.post(
         f"{API_BASE_URL}/query",
         json=payload,
         timeout=90
     )
     
     if response.status_code == 200:
-        result = response.json()
+        result = json_loads(response.content)
         answer = result['answer']
         sources = result.get('sources', [])
         
-        # Check sources
-        unique_sources = list(set(s.get('source', 'Unknown') for s in sources))
+        # Check sources: chunks per source in one pass
+        source_counts = Counter(s.get('source', 'Unknown') for s in sources)
         
         print("✅ SUCCESS!")
         print("=" * 80)
-        print(f"\n📊 Retrieved {len(sources)} chunks from {len(unique_sources)} sources:")
-        for src in unique_sources:
-            count = sum(1 for s in sources if s.get('source') == src)
+        print(f"\n📊 Retrieved {len(sources)} chunks from {len(source_counts)} sources:")
+        for src, count in source_counts.items():
             print(f"  - {src}: {count} chunks")
         
         print("\n" + "=" * 80)
@@ -60,10 +64,14 @@ try:
         print("SOURCE MENTIONS:")
         print("=" * 80)
         
-        answer_lower = answer.lower()
-        amadeus = 'amadeus' in answer_lower
-        accenture = 'accenture' in answer_lower or 'travel-industrys' in answer_lower
-        wef = 'wef' in answer_lower or 'world economic' in answer_lower
+        # One case-insensitive pass over the answer instead of lowercasing a
+        # copy and scanning it once per keyword; stops once all three are seen
+        mentioned = set()
+        for match in MENTION_RE.finditer(answer):
+            mentioned.add(match.lastindex)
+            if len(mentioned) == 3:
+                break
+        amadeus, accenture, wef = (group in mentioned for group in (1, 2, 3))
         
         print(f"  {'✅' if amadeus else '❌'} Amadeus")
         print(f"  {'✅' if accenture else '❌'} Accenture/Travel Industry")
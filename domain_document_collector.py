@@ -5,6 +5,9 @@ Processes the 99 documents downloaded by auto_document_downloader.py
 
 import os
 import sys
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import logging
@@ -14,7 +17,7 @@ from dotenv import load_dotenv
 from tqdm import tqdm
 
 # Import from existing app2.py
-from app2 import ingest_document
+from app2 import ingest_document, get_pinecone_index, VectorUploader, config
 
 # Setup logging
 logging.basicConfig(
@@ -32,7 +35,8 @@ load_dotenv()
 
 # Configuration
 DOWNLOADED_DOCS_ROOT = "./downloaded_docs"
-SUPPORTED_EXTENSIONS = ['.txt', '.csv', '.pdf', '.docx', '.xlsx']
+SUPPORTED_EXTENSIONS = frozenset({'.txt', '.csv', '.pdf', '.docx', '.xlsx'})
+MANIFEST_PATH = "ingestion_manifest.json"  # Content hashes of files already in Pinecone
 
 class IngestionStats:
     """Track ingestion statistics"""
@@ -40,6 +44,7 @@ class IngestionStats:
         self.total_files = 0
         self.successful = 0
         self.failed = 0
+        self.skipped = 0
         self.total_chunks = 0
         self.start_time = datetime.now()
         self.errors = []
@@ -56,6 +61,18 @@ class IngestionStats:
         self.errors.append({'file': filename, 'error': error, 'domain': domain})
         logger.error(f"❌ [{domain.upper()}] {filename} - {error}")
     
+    def add_skipped(self, filename: str, domain: str):
+        self.skipped += 1
+        self.by_domain[domain] += 1
+        logger.info(f"⏭️  [{domain.upper()}] {filename} (already ingested)")
+    
+    def add_result(self, filename: str, chunks: int, domain: str, error: str = None):
+        """Record an ingest_file() result"""
+        if error is None:
+            self.add_success(filename, chunks, domain)
+        else:
+            self.add_failure(filename, error, domain)
+    
     def print_summary(self):
         duration = (datetime.now() - self.start_time).total_seconds()
         print("\n" + "="*80)
@@ -64,6 +81,7 @@ class IngestionStats:
         print(f"Total Files Processed: {self.total_files}")
         print(f"✅ Successful: {self.successful}")
         print(f"❌ Failed: {self.failed}")
+        print(f"⏭️  Skipped (already ingested): {self.skipped}")
         print(f"📦 Total Chunks Created: {self.total_chunks}")
         print(f"⏱️  Duration: {duration:.2f} seconds")
         print(f"⚡ Average: {duration/max(self.total_files, 1):.2f} sec/file")
@@ -80,38 +98,83 @@ class IngestionStats:
             if len(self.errors) > 10:
                 print(f"  ... and {len(self.errors) - 10} more errors")
 
-def process_text_file(file_path: Path) -> str:
-    """Read text file content"""
+def process_text_file(file_path: Path) -> bytes:
+    """Read text file content as UTF-8 bytes with newlines normalized"""
+    raw = file_path.read_bytes()
+    
+    # Same newline handling as reading in text mode
+    if b'\r' in raw:
+        raw = raw.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        # UTF-8 files are passed on as read instead of decoded and re-encoded
+        raw.decode('utf-8')
+        return raw
     except UnicodeDecodeError:
         # Try with different encoding
-        with open(file_path, 'r', encoding='latin-1') as f:
-            return f.read()
+        return raw.decode('latin-1').encode('utf-8')
 
-def ingest_single_file(file_path: Path, domain: str, stats: IngestionStats):
-    """Ingest a single file into Pinecone"""
+def load_manifest() -> Dict:
+    """{content hash: {filename, domain, chunks, ingested_at}} from earlier runs"""
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest: Dict):
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+def ingest_file(file_path: Path, domain: str, uploader: VectorUploader = None,
+                manifest: Dict = None) -> tuple:
+    """
+    Ingest a single file into Pinecone unless its content hash is in manifest
+    Returns (filename, chunks, domain, error, content_hash) with error None on
+    success; touches no shared state but the thread-safe uploader, so it can
+    run on worker threads. With an uploader the caller flushes it
+    """
+    content_hash = None
     try:
         # Read file content
         if file_path.suffix.lower() == '.txt':
-            text_content = process_text_file(file_path)
-            file_content = text_content.encode('utf-8')
+            file_content = process_text_file(file_path)
         else:
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
+            file_content = file_path.read_bytes()
+        
+        # Unchanged files from earlier runs are already in Pinecone
+        content_hash = hashlib.blake2b(file_content, digest_size=16).hexdigest()
+        if manifest and content_hash in manifest:
+            return file_path.name, manifest[content_hash]['chunks'], domain, None, content_hash
         
         # Ingest document using app2.py function
-        result = ingest_document(file_content, file_path.name, domain, user_id=None)
+        result = ingest_document(file_content, file_path.name, domain, user_id=None, uploader=uploader)
         
         if result.get('status') == 'success':
-            stats.add_success(file_path.name, result.get('chunks_created', 0), domain)
+            return file_path.name, result.get('chunks_created', 0), domain, None, content_hash
         else:
             error_msg = result.get('message', 'Unknown error')
-            stats.add_failure(file_path.name, error_msg, domain)
+            return file_path.name, 0, domain, error_msg, content_hash
     
     except Exception as e:
-        stats.add_failure(file_path.name, str(e), domain)
+        return file_path.name, 0, domain, str(e), content_hash
+
+def ingest_single_file(file_path: Path, domain: str, stats: IngestionStats):
+    """Ingest a single file into Pinecone"""
+    filename, chunks, domain, error, _ = ingest_file(file_path, domain)
+    stats.add_result(filename, chunks, domain, error)
+
+def iter_documents(folder: Path):
+    """Supported files under folder, skipping hidden folders"""
+    # The extension is checked on the DirEntry name, so Path objects are
+    # only built for files that will be ingested
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith('.'):
+                    yield from iter_documents(entry.path)
+            elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield Path(entry.path)
 
 def find_all_downloaded_documents() -> List[tuple]:
     """Find all downloaded documents"""
@@ -125,21 +188,17 @@ def find_all_downloaded_documents() -> List[tuple]:
     # Travel documents
     travel_path = root / "travel"
     if travel_path.exists():
-        for file_path in travel_path.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                documents.append((file_path, 'travel'))
+        documents.extend((file_path, 'travel') for file_path in iter_documents(travel_path))
     
     # Real estate documents
     real_estate_path = root / "real_estate"
     if real_estate_path.exists():
-        for file_path in real_estate_path.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
-                documents.append((file_path, 'real_estate'))
+        documents.extend((file_path, 'real_estate') for file_path in iter_documents(real_estate_path))
     
     return documents
 
-def ingest_downloaded_documents():
-    """Main ingestion function"""
+def ingest_downloaded_documents(workers: int = 8, reingest: bool = False):
+    """Main ingestion function; reingest ignores the manifest of earlier runs"""
     
     print("="*80)
     print("🚀 DOMAIN DOCUMENT COLLECTOR")
@@ -199,8 +258,49 @@ def ingest_downloaded_documents():
     # Ingest documents with progress bar
     print("\n🚀 Starting ingestion...\n")
     
-    for file_path, domain in tqdm(documents, desc="Ingesting", unit="doc"):
-        ingest_single_file(file_path, domain, stats)
+    # All files share upsert batches, so vectors from small files are packed
+    # into full Pinecone requests instead of one partial request per file
+    try:
+        uploader = VectorUploader(get_pinecone_index(), config.PINECONE_UPSERT_BATCH)
+    except Exception as e:
+        logger.error(f"❌ Could not connect to Pinecone: {str(e)}")
+        return
+    
+    manifest = load_manifest()
+    known = {} if reingest else manifest
+    
+    # Files are ingested concurrently; results are recorded on the main
+    # thread once every upsert has landed, so stats need no locking
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda document: ingest_file(*document, uploader, known), documents)
+        results = list(tqdm(results, total=len(documents), desc="Ingesting", unit="doc"))
+    
+    try:
+        uploader.flush()
+    except Exception as e:
+        # A failed batch can't be pinned on one file; every file whose
+        # vectors went to the uploader is reported failed. Files skipped via
+        # the manifest or already failed keep their result
+        results = [
+            (filename, chunks, domain, error, content_hash)
+            if error is not None or content_hash in known
+            else (filename, 0, domain, f"Upsert failed: {str(e)}", content_hash)
+            for filename, chunks, domain, error, content_hash in results
+        ]
+    
+    for filename, chunks, domain, error, content_hash in results:
+        if error is None and content_hash in known:
+            stats.add_skipped(filename, domain)
+            continue
+        stats.add_result(filename, chunks, domain, error)
+        if error is None:
+            manifest[content_hash] = {
+                'filename': filename,
+                'domain': domain,
+                'chunks': chunks,
+                'ingested_at': datetime.now().isoformat()
+            }
+    save_manifest(manifest)
     
     # Print final summary
     stats.print_summary()
@@ -225,7 +325,7 @@ def ingest_downloaded_documents():
     print("\n📊 Your Pinecone vector database now contains:")
     print(f"  - {stats.by_domain['travel']} Travel documents")
     print(f"  - {stats.by_domain['real_estate']} Real Estate documents")
-    print(f"  - Total: {stats.successful} documents with {stats.total_chunks} chunks")
+    print(f"  - Total: {stats.successful + stats.skipped} documents ({stats.total_chunks} new chunks)")
     print("\n🎯 Next Steps:")
     print("  1. Test queries: python interactive_query.py")
     print("  2. Check Pinecone data: python check_pinecone_data.py")
@@ -237,6 +337,8 @@ if __name__ == "__main__":
     
     parser = argparse.ArgumentParser(description='Ingest downloaded domain documents into Pinecone')
     parser.add_argument('--dry-run', action='store_true', help='Show what would be ingested without actually ingesting')
+    parser.add_argument('--reingest', action='store_true', help='Ingest every file again, even if unchanged since an earlier run')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('INGEST_WORKERS', 8)), help='Files ingested concurrently')
     
     args = parser.parse_args()
     
@@ -247,4 +349,4 @@ if __name__ == "__main__":
         for file_path, domain in documents:
             print(f"  [{domain}] {file_path}")
     else:
-        ingest_downloaded_documents()
+        ingest_downloaded_documents(args.workers, args.reingest)
@@ -4,8 +4,11 @@ Download 100+ additional real estate documents
 Building on existing Zillow + Realtor.com data
 """
 
+import io
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from tqdm import tqdm
 import time
@@ -16,6 +19,24 @@ class ExpandedRealEstateDownloader:
         self.output = Path(output_dir)
         self.output.mkdir(exist_ok=True)
         self.count = 0
+        
+        # Pooled session: the Zillow, HUD and city-portal downloads each hit
+        # one host repeatedly, so keep connections open between requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['User-Agent'] = 'DomainDocCollector/1.0'
+    
+    def fetch(self, url):
+        """Download a URL through the pooled session, raising on HTTP errors"""
+        response = self.session.get(url, timeout=60)
+        response.raise_for_status()
+        return response
     
     def log(self, msg):
         print(f"[{self.count:03d}] {msg}")
@@ -66,7 +87,7 @@ class ExpandedRealEstateDownloader:
         for name, path in tqdm(datasets.items(), desc="Zillow"):
             try:
                 url = base + path
-                df = pd.read_csv(url)
+                df = pd.read_csv(io.BytesIO(self.fetch(url).content))
                 
                 output_file = self.output / "zillow_data" / f"{name}.txt"
                 output_file.parent.mkdir(exist_ok=True)
@@ -109,7 +130,7 @@ class ExpandedRealEstateDownloader:
         # Load base Zillow data
         try:
             base_url = "https://files.zillowstatic.com/research/public_csvs/zhvi/Metro_zhvi_uc_sfrcondo_tier_0.33_0.67_sm_sa_month.csv"
-            zhvi = pd.read_csv(base_url)
+            zhvi = pd.read_csv(io.BytesIO(self.fetch(base_url).content))
             
             output_path = self.output / "metro_reports"
             output_path.mkdir(exist_ok=True)
@@ -267,7 +288,7 @@ class ExpandedRealEstateDownloader:
         try:
             print("Downloading HUD Fair Market Rents...")
             fmr_url = "https://www.huduser.gov/portal/datasets/fmr/fmr2024/FY24_4050_FMRs.xlsx"
-            fmr = pd.read_excel(fmr_url)
+            fmr = pd.read_excel(io.BytesIO(self.fetch(fmr_url).content))
             
             filename = output_path / "fair_market_rents_2024.txt"
             with open(filename, 'w') as f:
@@ -287,7 +308,7 @@ class ExpandedRealEstateDownloader:
         try:
             print("Downloading HUD Income Limits...")
             il_url = "https://www.huduser.gov/portal/datasets/il/il2024/Section8-FY24.xlsx"
-            income_limits = pd.read_excel(il_url)
+            income_limits = pd.read_excel(io.BytesIO(self.fetch(il_url).content))
             
             filename = output_path / "income_limits_2024.txt"
             with open(filename, 'w') as f:
@@ -318,7 +339,7 @@ class ExpandedRealEstateDownloader:
         try:
             print("Downloading NYC property data...")
             nyc_url = "https://data.cityofnewyork.us/resource/w2pb-icbu.json?$limit=1000"
-            response = requests.get(nyc_url)
+            response = self.session.get(nyc_url, timeout=30)
             nyc_data = response.json()
             
             filename = output_path / "nyc_property_sales.txt"
@@ -342,7 +363,7 @@ class ExpandedRealEstateDownloader:
         try:
             print("Downloading Chicago data...")
             chi_url = "https://data.cityofchicago.org/resource/wrvz-psew.json?$limit=1000"
-            response = requests.get(chi_url)
+            response = self.session.get(chi_url, timeout=30)
             chi_data = response.json()
             
             filename = output_path / "chicago_property_sales.txt"
@@ -0,0 +1,8 @@
+"""
+WSGI entry point for the document analysis server (app.py)
+Run with: gunicorn -w 4 --threads 8 --timeout 300 wsgi:app
+"""
+from app import app
+
+if __name__ == "__main__":
+    app.run(port=5000, threaded=True)